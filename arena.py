@@ -0,0 +1,367 @@
+"""
+Arena
+a checked AST stored in parallel array columns (struct of arrays)
+instead of one object per node and one Token per leaf
+
+    arena = NodeArena.from_tree(tree)
+    Interpreter(arena.root).interpret()
+
+a node is an index in the columns: its kind, three int fields and the
+index of its token, the tokens are columns too. arena.root and the
+nodes reached from it are views: thin objects made on access that read
+the columns, with the attributes of the node they stand for, so every
+visitor walks them like the tree. A view is a subclass of its node
+class and reports that class as __class__, for the visitors' dispatch.
+
+the arena takes about a fifth of the memory of the tree
+(benchmarks/node_memory.py), but walking it makes a view per node
+visited, so running from it is slower. It is read only: the tree is
+converted once checked, and optimized if it is.
+"""
+from array import array
+
+import nodes
+from interpreter import INTEGER, REAL, ProcedureSymbol
+from tokens import TOKEN_TYPES, Token
+
+# the kind column is the index of the node class in this tuple
+NODE_TYPES = (
+    nodes.Program,
+    nodes.Block,
+    nodes.VarDecl,
+    nodes.ProcedureDecl,
+    nodes.ProcedureCall,
+    nodes.Param,
+    nodes.Compound,
+    nodes.Assign,
+    nodes.Type,
+    nodes.Var,
+    nodes.Num,
+    nodes.NoOp,
+    nodes.BinOp,
+    nodes.UnaryOp,
+)
+_NODE_KINDS = {node_type: kind for kind, node_type in enumerate(NODE_TYPES)}
+_TOKEN_KINDS = {token_type: kind for kind, token_type in enumerate(TOKEN_TYPES)}
+
+# the type column is the index of the expression type in this tuple
+TYPES = (None, INTEGER, REAL)
+_TYPE_KINDS = {name: kind for kind, name in enumerate(TYPES)}
+
+NONE = -1  # no node, no token
+
+
+class NodeArena(object):
+    """the columns, per node kind the fields hold:
+
+        kind            first           second              third
+        Program         block
+        Block           declarations*   compound_statement
+        VarDecl         var_node        type_node
+        ProcedureDecl   params*         block_node          procedure
+        ProcedureCall   actual_params*  procedure           depth
+        Param           var_node        type_node
+        Compound        children*
+        Assign          left            right
+        Var             depth           slot                type
+        Num                                                 type
+        BinOp           left            right               type
+        UnaryOp         expr                                type
+
+    a node field is its index, a list field (*) the offset of the list
+    in lists: its length then the indices. procedure is the number of a
+    procedure in the procedure tables. Assign, Type, Var, Num, BinOp,
+    UnaryOp and ProcedureCall have a token.
+    """
+
+    def __init__(self):
+        self.kinds = array('B')  # index of the node class in NODE_TYPES
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.tokens = array('i')  # index of the node's token, NONE if it has none
+        self.lists = array('i')  # the child lists
+
+        self.token_kinds = array('B')  # index of the token type in TOKEN_TYPES
+        self.token_offsets = array('q')  # character offset
+        self.token_values = []
+        self.lines = None  # the LineIndex of the source, shared by all tokens
+
+        self.name = None  # program name
+        self.var_slots = None  # the program's variable slots
+        # the procedure tables, by procedure number
+        self.symbols = []  # ProcedureSymbol, with the view of the declaration
+        self.procedure_slots = []  # the procedure's variable slots
+        self.pure = array('B')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self):
+        """the view of the program, the last node"""
+        return self.node(len(self.kinds) - 1)
+
+    def node(self, index):
+        """the view of the node at index, None for NONE"""
+        if index == NONE:
+            return None
+        return _VIEWS[self.kinds[index]](self, index)
+
+    def node_list(self, offset):
+        lists = self.lists
+        node = self.node
+        return [node(lists[i]) for i in range(offset + 1, offset + 1 + lists[offset])]
+
+    def token(self, index):
+        """create the Token at index"""
+        if index == NONE:
+            return None
+        return Token(TOKEN_TYPES[self.token_kinds[index]], self.token_values[index],
+                     self.token_offsets[index], self.lines)
+
+    @classmethod
+    def from_tree(cls, tree):
+        """the arena of a tree the SemanticAnalyzer checked, the nodes
+        are added children first, with an explicit stack
+        """
+        arena = cls()
+        numbers = {}  # ProcedureDecl -> procedure number
+        strings = {}  # to store each name once
+        done = []  # the indices of the nodes added, whose parent is not
+        todo = [(tree, False, 0)]  # (node, children added, scope level)
+        while todo:
+            node, ready, level = todo.pop()
+            if ready:
+                done.append(arena._add(node, done, numbers, strings))
+                continue
+            if node.__class__ is nodes.ProcedureDecl:
+                # numbered before its body, for the calls in it. The
+                # symbol has what the engines use: the level and the
+                # declaration, set once it is added
+                numbers[node] = len(numbers)
+                symbol = ProcedureSymbol(node.proc_name)
+                symbol.scope_level = level
+                arena.symbols.append(symbol)
+                arena.procedure_slots.append(node.var_slots)
+                arena.pure.append(bool(node.pure))
+            if node.__class__ in (nodes.Program, nodes.ProcedureDecl):
+                level += 1
+            todo.append((node, True, level))
+            todo.extend((child, False, level) for child in reversed(list(nodes.iter_child_nodes(node))))
+        return arena
+
+    def _add(self, node, done, numbers, strings):
+        """add a node whose children are the last indices of done, return its index"""
+        fields = [NONE, NONE, NONE]
+        children = list(nodes.iter_child_nodes(node))
+        indices = done[len(done) - len(children):]
+        del done[len(done) - len(children):]
+        position = 0
+        for i, field in enumerate(node._fields):
+            value = getattr(node, field)
+            if isinstance(value, list):
+                fields[i] = len(self.lists)
+                self.lists.append(len(value))
+                self.lists.extend(indices[position:position + len(value)])
+                position += len(value)
+            elif value is not None:
+                fields[i] = indices[position]
+                position += 1
+
+        index = len(self.kinds)
+        cls = node.__class__
+        if cls is nodes.Var:
+            # the variables of declarations are not addressed
+            fields = [_field(node.depth), _field(node.slot), _TYPE_KINDS[node.type]]
+        elif cls in (nodes.Num, nodes.BinOp, nodes.UnaryOp):
+            fields[2] = _TYPE_KINDS[node.type]
+        elif cls is nodes.ProcedureCall:
+            fields[1] = numbers[node.proc_symbol.decl]
+            fields[2] = node.depth
+        elif cls is nodes.ProcedureDecl:
+            number = fields[2] = numbers[node]
+            self.symbols[number].decl = _VIEWS[_NODE_KINDS[cls]](self, index)
+        elif cls is nodes.Program:
+            self.name = node.name
+            self.var_slots = node.var_slots
+
+        self.kinds.append(_NODE_KINDS[cls])
+        self.first.append(fields[0])
+        self.second.append(fields[1])
+        self.third.append(fields[2])
+        token = getattr(node, 'token', None)
+        self.tokens.append(NONE if token is None else self._add_token(token, strings))
+        return index
+
+    def _add_token(self, token, strings):
+        value = token.value
+        if isinstance(value, str):
+            value = strings.setdefault(value, value)
+        if self.lines is None:
+            self.lines = token.lines
+        self.token_kinds.append(_TOKEN_KINDS[token.type])
+        self.token_offsets.append(token.offset)
+        self.token_values.append(value)
+        return len(self.token_values) - 1
+
+
+def _field(value):
+    return NONE if value is None else value
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    node views    ---------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+class NodeView(object):
+    """a node of an arena: the arena and the index. Two views of the
+    same node are equal, so they can be keys, like the nodes
+    """
+    __slots__ = ()
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, NodeView)
+                and other.arena is self.arena and other.index == self.index)
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+
+def _child(column):
+    def get(self):
+        arena = self.arena
+        return arena.node(getattr(arena, column)[self.index])
+    return property(get)
+
+
+def _children(column):
+    def get(self):
+        arena = self.arena
+        return arena.node_list(getattr(arena, column)[self.index])
+    return property(get)
+
+
+def _number(column):
+    def get(self):
+        value = getattr(self.arena, column)[self.index]
+        return None if value == NONE else value
+    return property(get)
+
+
+def _type(self):
+    return TYPES[self.arena.third[self.index]]
+
+
+def _token(self):
+    arena = self.arena
+    return arena.token(arena.tokens[self.index])
+
+
+def _value(self):
+    arena = self.arena
+    return arena.token_values[arena.tokens[self.index]]
+
+
+def _procedure(table):
+    def get(self):
+        arena = self.arena
+        return getattr(arena, table)[arena.third[self.index]]
+    return property(get)
+
+
+def _arena(name):
+    return property(lambda self: getattr(self.arena, name))
+
+
+# the attributes of a view, per node class
+_ATTRIBUTES = {
+    nodes.Program: dict(
+        block=_child('first'),
+        name=_arena('name'),
+        var_slots=_arena('var_slots'),
+    ),
+    nodes.Block: dict(
+        declarations=_children('first'),
+        compound_statement=_child('second'),
+    ),
+    nodes.VarDecl: dict(
+        var_node=_child('first'),
+        type_node=_child('second'),
+    ),
+    nodes.ProcedureDecl: dict(
+        params=_children('first'),
+        block_node=_child('second'),
+        proc_name=property(lambda self: self.arena.symbols[self.arena.third[self.index]].name),
+        token=property(_token),
+        var_slots=_procedure('procedure_slots'),
+        pure=property(lambda self: bool(self.arena.pure[self.arena.third[self.index]])),
+    ),
+    nodes.ProcedureCall: dict(
+        actual_params=_children('first'),
+        proc_name=property(_value),
+        token=property(_token),
+        proc_symbol=property(lambda self: self.arena.symbols[self.arena.second[self.index]]),
+        depth=_number('third'),
+    ),
+    nodes.Param: dict(
+        var_node=_child('first'),
+        type_node=_child('second'),
+    ),
+    nodes.Compound: dict(
+        children=_children('first'),
+    ),
+    nodes.Assign: dict(
+        left=_child('first'),
+        right=_child('second'),
+        token=property(_token),
+        op=property(_token),
+    ),
+    nodes.Type: dict(
+        token=property(_token),
+        value=property(_value),
+    ),
+    nodes.Var: dict(
+        token=property(_token),
+        value=property(_value),
+        depth=_number('first'),
+        slot=_number('second'),
+        type=property(_type),
+    ),
+    nodes.Num: dict(
+        token=property(_token),
+        value=property(_value),
+        type=property(_type),
+    ),
+    nodes.NoOp: dict(),
+    nodes.BinOp: dict(
+        left=_child('first'),
+        right=_child('second'),
+        token=property(_token),
+        op=property(_token),
+        type=property(_type),
+    ),
+    nodes.UnaryOp: dict(
+        expr=_child('first'),
+        token=property(_token),
+        op=property(_token),
+        type=property(_type),
+    ),
+}
+
+
+def _view_class(node_type):
+    attributes = dict(_ATTRIBUTES[node_type])
+    attributes['__slots__'] = ('arena', 'index')
+    # the visitors dispatch on __class__ and test it with `is`
+    attributes['__class__'] = property(lambda self: node_type)
+    return type(node_type.__name__ + 'View', (NodeView, node_type), attributes)
+
+
+# the view class of each node kind
+_VIEWS = tuple(_view_class(node_type) for node_type in NODE_TYPES)
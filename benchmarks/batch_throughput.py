@@ -0,0 +1,62 @@
+"""
+benchmark: batch mode against one main.py process per program
+
+    python benchmarks/batch_throughput.py [--programs N] [--statements N]
+
+it writes N small generated programs to a temporary directory, runs
+`main.py program.pas` for each one, then `main.py` once over all of them
+with 1, 2, 4, ... up to the CPU count workers, and prints programs/s.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from generator import ProgramGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def timed(command):
+    start = time.perf_counter()
+    subprocess.run(command, check=False, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='batch mode throughput')
+    parser.add_argument('--programs', type=int, default=200)
+    parser.add_argument('--statements', type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(args.programs):
+            path = os.path.join(directory, f'program{i}.pas')
+            with open(path, 'w') as f:
+                f.write(ProgramGenerator(statements=args.statements, procedures=2, seed=i).generate())
+            paths.append(path)
+        print(f'{args.programs} programs of {args.statements} statements, {os.cpu_count()} CPUs')
+
+        elapsed = sum(timed([sys.executable, MAIN, path]) for path in paths)
+        sequential = args.programs / elapsed
+        print(f'{"one process each":>18}: {elapsed:8.3f}s {sequential:8.1f} programs/s')
+
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            elapsed = timed([sys.executable, MAIN, '--workers', str(workers)] + paths)
+            rate = args.programs / elapsed
+            print(f'{workers:>10} workers: {elapsed:8.3f}s {rate:8.1f} programs/s '
+                  f'{rate / sequential:6.1f}x')
+            workers *= 2
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
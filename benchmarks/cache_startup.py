@@ -0,0 +1,79 @@
+"""
+benchmark: startup time of main.py with and without the program cache
+
+    python benchmarks/cache_startup.py [--statements N] [--repeat N] [--engine E]
+
+it writes a generated program to a temporary directory and times
+`main.py program.pas` uncached, with --cache on a cold cache (which also
+writes the entry) and with --cache on a warm cache. the times are for the
+whole process, so they include the interpreter start and the imports.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+STATEMENT = '    x{v} := (x{w} + {i}) * 3 - y DIV 7 + {i};\n'
+
+
+def make_program(statements, variables=50):
+    lines = ['program Main;\n', 'var\n']
+    lines.append('    ' + ', '.join(f'x{v}' for v in range(variables)) + ', y : integer;\n')
+    lines.append('begin\n')
+    lines.append('    y := 1;\n')
+    lines.extend('    x{v} := {v};\n'.format(v=v) for v in range(variables))
+    for i in range(statements):
+        lines.append(STATEMENT.format(v=i % variables, w=(i * 7 + 3) % variables, i=i % 100))
+    lines.append('end.\n')
+    return ''.join(lines)
+
+
+def run_main(*args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN] + list(args), check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='program cache startup benchmark')
+    parser.add_argument('--statements', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--engine', default='tree')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'program.pas')
+        with open(path, 'w') as f:
+            f.write(make_program(args.statements))
+        print(f'program: {args.statements} statements, {os.path.getsize(path) / 1024:.0f} KB, '
+              f'engine {args.engine}')
+
+        engine = ['--engine', args.engine]
+        uncached = min(run_main(path, *engine) for _ in range(args.repeat))
+
+        cache_dir = os.path.join(directory, '__nancache__')
+        cold = []
+        for _ in range(args.repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(run_main(path, '--cache', *engine))
+        cold = min(cold)
+        warm = min(run_main(path, '--cache', *engine) for _ in range(args.repeat))
+        size = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+        print(f'{"no cache":>12}: {uncached:8.3f}s')
+        print(f'{"cold cache":>12}: {cold:8.3f}s')
+        print(f'{"warm cache":>12}: {warm:8.3f}s  speedup {uncached / warm:5.2f}x, '
+              f'{size / 1024:.0f} KB cached')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
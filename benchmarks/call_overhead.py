@@ -0,0 +1,86 @@
+"""
+benchmark: procedure calls per second of each engine
+
+    python benchmarks/call_overhead.py [--levels N] [--fanout N] [--repeat N]
+
+the program has a chain of nested procedures, each one calling the next
+--fanout times with two arguments, and the innermost one doing a single
+assignment, so a run makes fanout ** levels calls and little else. the
+language has no loops, the fan-out is what makes the calls many.
+
+the procedures are pure and called with the same arguments, tree+memo
+runs the tree walker with a MemoCache: it runs one body per level, the
+calls/s are those of the program.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bytecode import Compiler, VM  # noqa: E402
+from closure import ClosureInterpreter  # noqa: E402
+from interpreter import Interpreter, MemoCache, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from transpiler import PythonInterpreter  # noqa: E402
+
+ENGINES = {
+    'tree': Interpreter,
+    'tree+memo': lambda tree: Interpreter(tree, MemoCache()),
+    'closure': ClosureInterpreter,
+    'bytecode': lambda tree: VM(Compiler().compile(tree)),
+    'python': PythonInterpreter,
+}
+
+
+def generate(levels, fanout):
+    """the program text, P1 encloses P2 ... encloses P{levels}"""
+    lines = ['program Calls;', 'var x, y : integer;']
+    for level in range(1, levels + 1):
+        indent = '   ' * level
+        lines.append(f'{indent}procedure P{level}(a, b : integer);')
+        lines.append(f'{indent}var c : integer;')
+    for level in range(levels, 0, -1):
+        indent = '   ' * level
+        lines.append(f'{indent}begin')
+        if level == levels:
+            lines.append(f'{indent}   c := a + b')
+        else:
+            calls = [f'{indent}   P{level + 1}(a, b + 1)'] * fanout
+            lines.append(';\n'.join(calls))
+        lines.append(f'{indent}end;')
+    lines.append('begin')
+    lines.append('   x := 1;')
+    lines.append('   y := 2;')
+    lines.append('   P1(x, y)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='procedure call overhead')
+    parser.add_argument('--levels', type=int, default=5)
+    parser.add_argument('--fanout', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tree = StreamParser(RegexLexer(generate(args.levels, args.fanout)).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    calls = sum(args.fanout ** level for level in range(args.levels))
+    print(f'{calls:,} calls per run')
+
+    for name, engine in ENGINES.items():
+        best = None
+        for _ in range(args.repeat):
+            interpreter = engine(tree)
+            start = time.perf_counter()
+            interpreter.interpret()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{name:>10}: {best:8.3f}s {calls / best:12,.0f} calls/s')
+
+
+if __name__ == '__main__':
+    main()
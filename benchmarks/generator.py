@@ -0,0 +1,189 @@
+"""
+synthetic program generator for the benchmarks
+
+    python benchmarks/generator.py [--statements N] [--depth N] [--procedures N]
+                                   [--nesting N] [--comments F] [--seed N]
+
+prints a valid program of the requested shape. every block reads only
+variables that are set once (the program's inputs, or the parameters of
+a procedure) and writes its own variables, so the values stay small
+however many statements there are, and a procedure only calls procedures
+declared inside it, so there is no recursion.
+"""
+import argparse
+import random
+
+INTEGER_OPERATORS = ('+', '-', '*', 'DIV')
+REAL_OPERATORS = ('+', '-', '*', '/')
+
+
+class Scope(object):
+    """the names a block can read and write"""
+
+    def __init__(self, integers, reals, outputs, level):
+        self.integers = integers  # readable integer variables
+        self.reals = reals  # readable real variables
+        self.outputs = outputs  # (name, is_real) of the variables it assigns
+        self.level = level
+        self.procedures = []  # (name, param types) declared in the block
+
+
+class ProgramGenerator(object):
+    """
+    statements: assignments and calls in all the blocks together
+    depth: operators nested in each expression
+    procedures: number of procedures
+    nesting: how deep procedures may be declared in procedures
+    comments: chance of a comment after each statement
+    """
+
+    def __init__(self, statements=1000, depth=3, procedures=0, nesting=1,
+                 comments=0.0, variables=8, seed=0):
+        self.statements = statements
+        self.depth = depth
+        self.procedures = procedures
+        self.nesting = nesting
+        self.comments = comments
+        self.variables = variables
+        self.random = random.Random(seed)
+
+    def generate(self):
+        # the procedure tree: each one is declared in the program or in
+        # a procedure that is not nested too deep yet
+        parents = [None]
+        children = {None: []}
+        levels = {None: 0}
+        for number in range(self.procedures):
+            candidates = [p for p in parents if levels[p] < self.nesting]
+            parent = self.random.choice(candidates)
+            children[parent].append(number)
+            children[number] = []
+            levels[number] = levels[parent] + 1
+            parents.append(number)
+
+        blocks = self.procedures + 1
+        self.budget = [self.statements // blocks] * blocks
+        for i in range(self.statements % blocks):
+            self.budget[i] += 1
+
+        lines = ['program Bench;\n']
+        names = [f'a{i}' for i in range(self.variables)]
+        reals = [f'r{i}' for i in range(self.variables)]
+        outputs = [(f'x{i}', False) for i in range(self.variables)]
+        outputs += [(f'y{i}', True) for i in range(self.variables)]
+        scope = Scope(names, reals, outputs, 0)
+        self.declare_variables(lines, names + [name for name, real in outputs if not real],
+                               reals + [name for name, real in outputs if real], '')
+        self.declare_procedures(lines, scope, None, children)
+
+        lines.append('begin\n')
+        body = [f'{name} := {self.random.randint(1, 9)}' for name in names]
+        body += [f'{name} := {self.random.randint(1, 9)}.{self.random.randint(0, 99)}'
+                 for name in reals]
+        body += self.statement_list(scope, self.budget[-1])
+        self.write_statements(lines, body, '    ')
+        lines.append('end.\n')
+        return ''.join(lines)
+
+    def declare_variables(self, lines, integers, reals, indent):
+        lines.append(f'{indent}var\n')
+        if integers:
+            lines.append(f'{indent}    {", ".join(integers)} : integer;\n')
+        if reals:
+            lines.append(f'{indent}    {", ".join(reals)} : real;\n')
+
+    def declare_procedures(self, lines, scope, parent, children):
+        for number in children[parent]:
+            self.declare_procedure(lines, scope, number, children)
+
+    def declare_procedure(self, lines, enclosing, number, children):
+        indent = '    ' * enclosing.level
+        name = f'P{number}'
+        prefix = f'p{number}'
+        params = [(f'{prefix}n{i}', False) for i in range(2)] + [(f'{prefix}f0', True)]
+        outputs = [(f'{prefix}x{i}', False) for i in range(2)] + [(f'{prefix}y0', True)]
+        scope = Scope(
+            enclosing.integers + [p for p, real in params if not real],
+            enclosing.reals + [p for p, real in params if real],
+            outputs,
+            enclosing.level + 1,
+        )
+        enclosing.procedures.append((name, [real for _, real in params]))
+
+        lines.append(f'{indent}procedure {name}({params[0][0]}, {params[1][0]} : integer; '
+                     f'{params[2][0]} : real);\n')
+        self.declare_variables(lines, [o for o, real in outputs if not real],
+                               [o for o, real in outputs if real], indent)
+        self.declare_procedures(lines, scope, number, children)
+        lines.append(f'{indent}begin\n')
+        self.write_statements(lines, self.statement_list(scope, self.budget[number]),
+                              indent + '    ')
+        lines.append(f'{indent}end;\n')
+
+    def statement_list(self, scope, count):
+        statements = []
+        # each procedure declared here is called at least once
+        for name, params in scope.procedures[:count]:
+            statements.append(self.call(scope, name, params))
+        while len(statements) < count:
+            if scope.procedures and self.random.random() < 0.1:
+                name, params = self.random.choice(scope.procedures)
+                statements.append(self.call(scope, name, params))
+            else:
+                target, real = self.random.choice(scope.outputs)
+                statements.append(f'{target} := {self.expression(scope, real, self.depth)}')
+        self.random.shuffle(statements)
+        return statements
+
+    def call(self, scope, name, params):
+        args = ', '.join(self.expression(scope, real, min(self.depth, 2)) for real in params)
+        return f'{name}({args})'
+
+    def write_statements(self, lines, statements, indent):
+        last = len(statements) - 1
+        for i, statement in enumerate(statements):
+            end = '' if i == last else ';'
+            comment = ''
+            if self.comments and self.random.random() < self.comments:
+                comment = f' {{ statement {i} }}'
+            lines.append(f'{indent}{statement}{end}{comment}\n')
+
+    def expression(self, scope, real, depth):
+        if depth <= 0:
+            return self.leaf(scope, real)
+        operator = self.random.choice(REAL_OPERATORS if real else INTEGER_OPERATORS)
+        left = self.expression(scope, real, depth - 1)
+        if operator in ('DIV', '/'):
+            # only constant divisors, so nothing divides by zero
+            right = str(self.random.randint(1, 9)) + ('.5' if real else '')
+        else:
+            right = self.expression(scope, real, self.random.randint(0, depth - 1))
+        return f'({left} {operator} {right})'
+
+    def leaf(self, scope, real):
+        choice = self.random.random()
+        if choice < 0.3:
+            return str(self.random.randint(1, 9))
+        if choice < 0.4:
+            return f'-{self.random.choice(scope.integers)}'
+        if real and choice < 0.7:
+            return self.random.choice(scope.reals)
+        return self.random.choice(scope.integers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a benchmark program')
+    parser.add_argument('--statements', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=3, help='expression depth')
+    parser.add_argument('--procedures', type=int, default=0)
+    parser.add_argument('--nesting', type=int, default=1, help='procedure nesting depth')
+    parser.add_argument('--comments', type=float, default=0.0, help='comment density, 0 to 1')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generator = ProgramGenerator(args.statements, args.depth, args.procedures,
+                                 args.nesting, args.comments, seed=args.seed)
+    print(generator.generate(), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+benchmark: bytes per node of the checked program, as node objects with
+a __dict__, as node objects with __slots__ and as a NodeArena
+
+    python benchmarks/node_memory.py [--statements N] [--depth N]
+
+the memory is what tracemalloc sees still allocated once the program is
+parsed and analyzed (and converted), with the tokens, their values and
+the line index, so the whole cost of keeping the program. it also
+times a run of the tree walker over each. The __dict__ nodes are
+copies of the node classes without __slots__, put in the nodes module
+while the program is parsed and run.
+"""
+import argparse
+import contextlib
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nodes  # noqa: E402
+from arena import NodeArena  # noqa: E402
+from generator import ProgramGenerator  # noqa: E402
+from interpreter import Interpreter, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+
+
+def checked(text):
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    return tree
+
+
+@contextlib.contextmanager
+def unslotted():
+    """the node classes of the nodes module replaced by copies without
+    __slots__, a subclass would keep the slots of its base
+    """
+    base = type('AST', (object,), {'_fields': ()})
+    copies = {'AST': base}
+    for cls in nodes.AST.__subclasses__():
+        namespace = {
+            name: value for name, value in vars(cls).items()
+            if name != '__slots__' and name not in cls.__slots__
+        }
+        copies[cls.__name__] = type(cls.__name__, (base,), namespace)
+    saved = {name: getattr(nodes, name) for name in copies}
+    for name, cls in copies.items():
+        setattr(nodes, name, cls)
+    try:
+        yield
+    finally:
+        for name, cls in saved.items():
+            setattr(nodes, name, cls)
+
+
+def retained(build):
+    """(what build returns, bytes it still holds on to)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def run_time(root):
+    start = time.perf_counter()
+    Interpreter(root).interpret()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='memory of the checked program')
+    parser.add_argument('--statements', type=int, default=10000)
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args()
+
+    # no procedures: the calls of generated ones multiply, the run
+    # times would grow much faster than the program
+    text = ProgramGenerator(statements=args.statements, depth=args.depth).generate()
+    with unslotted():
+        tree, dict_bytes = retained(lambda: checked(text))
+        dict_time = run_time(tree)
+    del tree
+    tree, tree_bytes = retained(lambda: checked(text))
+    count = nodes.count_nodes(tree)
+    tree_time = run_time(tree)
+    del tree
+    arena, arena_bytes = retained(lambda: NodeArena.from_tree(checked(text)))
+    arena_time = run_time(arena.root)
+
+    print(f'{count:,} nodes')
+    print(f'{"__dict__ nodes":>15}: {dict_bytes / 2 ** 20:8.1f} MB {dict_bytes / count:8.1f} bytes/node '
+          f'{dict_time:8.3f}s run')
+    print(f'{"__slots__ nodes":>15}: {tree_bytes / 2 ** 20:8.1f} MB {tree_bytes / count:8.1f} bytes/node '
+          f'{tree_time:8.3f}s run')
+    print(f'{"arena":>15}: {arena_bytes / 2 ** 20:8.1f} MB {arena_bytes / count:8.1f} bytes/node '
+          f'{arena_time:8.3f}s run')
+
+
+if __name__ == '__main__':
+    main()
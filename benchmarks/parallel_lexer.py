@@ -0,0 +1,67 @@
+"""
+benchmark: parallel chunked lexing against the sequential regex lexer
+
+    python benchmarks/parallel_lexer.py [--size MB] [--repeat N]
+
+it prints the lexing time of RegexLexer.tokenize() and of lex_parallel()
+with 1, 2, 4, ... up to the CPU count workers, and the speedup.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexer import RegexLexer, lex_parallel  # noqa: E402
+
+STATEMENT = '   x{i} := (y + {i}) * 3 - 12.5 / alpha DIV 7; {{ comment {i} }}\n'
+
+
+def make_source(size):
+    """a program of about size characters"""
+    lines = ['program Main;\n', 'begin\n']
+    length = 0
+    i = 0
+    while length < size:
+        line = STATEMENT.format(i=i)
+        lines.append(line)
+        length += len(line)
+        i += 1
+    lines.append('end.\n')
+    return ''.join(lines)
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parallel lexer benchmark')
+    parser.add_argument('--size', type=float, default=32, help='source size in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_source(int(args.size * 1024 * 1024))
+    tokens = len(RegexLexer(text).tokenize())
+    print(f'source: {len(text) / 1024 / 1024:.1f} MB, {tokens} tokens, {os.cpu_count()} CPUs')
+
+    sequential = best_of(args.repeat, lambda: RegexLexer(text).tokenize())
+    print(f'{"sequential":>12}: {sequential:8.3f}s {tokens / sequential / 1e6:6.2f} Mtokens/s')
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        elapsed = best_of(args.repeat, lex_parallel, text, workers)
+        print(f'{workers:>4} workers: {elapsed:8.3f}s {tokens / elapsed / 1e6:6.2f} Mtokens/s '
+              f'speedup {sequential / elapsed:5.2f}x')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+benchmark suite: per-phase throughput on generated programs
+
+    python benchmarks/run_suite.py [--scale F] [--repeat N] [--engine E]
+                                   [--save FILE] [--baseline FILE] [--threshold F]
+
+for each workload it times the phases separately:
+
+    lex      the char Lexer, get_next_token() to EOF        tokens/s
+    parse    Parser over the tokens already lexed           nodes/s
+    analyze  SemanticAnalyzer                               nodes/s
+    execute  the --engine interpreter                       statements/s
+
+(statements are counted in the program text, a statement executed many
+times in a procedure counts once)
+
+and measures the peak memory each phase allocates, with tracemalloc in a
+separate run so tracing does not slow down the timed ones.
+
+--save writes the results as a JSON baseline, --baseline compares with
+one and exits with status 1 when a phase got slower, or needs more
+memory, by more than --threshold (a fraction, 0.10 by default).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nodes  # noqa: E402
+from bytecode import Compiler, VM  # noqa: E402
+from closure import ClosureInterpreter  # noqa: E402
+from generator import ProgramGenerator  # noqa: E402
+from interpreter import Interpreter, SemanticAnalyzer  # noqa: E402
+from lexer import Lexer  # noqa: E402
+from parser import Parser  # noqa: E402
+from tokens import TokenType  # noqa: E402
+from transpiler import PythonInterpreter  # noqa: E402
+
+# name -> ProgramGenerator arguments, statements are multiplied by --scale
+WORKLOADS = {
+    'flat': dict(statements=20000, depth=2),
+    'deep_expressions': dict(statements=2000, depth=7),
+    'procedures': dict(statements=20000, depth=2, procedures=200, nesting=4),
+    'comments': dict(statements=20000, depth=2, comments=0.8),
+}
+
+PHASES = ('lex', 'parse', 'analyze', 'execute')
+
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'bytecode': lambda tree: VM(Compiler().compile(tree)),
+    'python': PythonInterpreter,
+}
+
+
+class ReplayLexer(object):
+    """hands the parser tokens lexed before, so parsing is timed alone"""
+
+    def __init__(self, tokens, next_chars):
+        self.tokens = iter(tokens)
+        self.next_chars = iter(next_chars)
+        self.current_char = None
+
+    def get_next_token(self):
+        self.current_char = next(self.next_chars)
+        return next(self.tokens)
+
+
+def lex(text):
+    lexer = Lexer(text)
+    tokens = []
+    next_chars = []
+    while True:
+        token = lexer.get_next_token()
+        tokens.append(token)
+        # the parser looks at the char after an ID to spot calls
+        next_chars.append(lexer.current_char)
+        if token.type == TokenType.EOF:
+            return tokens, next_chars
+
+
+class Workload(object):
+    """a generated program and the result of each phase on it"""
+
+    def __init__(self, name, options, engine):
+        self.name = name
+        self.options = options
+        self.engine = engine
+        self.text = ProgramGenerator(**options).generate()
+        self.tokens, self.next_chars = lex(self.text)
+        self.tree = None
+        self.checked = None
+
+    def prepare(self, phase):
+        """a function running the phase alone"""
+        if phase == 'lex':
+            return lambda: lex(self.text)
+        if phase == 'parse':
+            return self.parse
+        if phase == 'analyze':
+            # the analyzer annotates the tree, a fresh one every time
+            tree = Parser(ReplayLexer(self.tokens, self.next_chars)).parse()
+            return lambda: SemanticAnalyzer().visit(tree)
+        if self.checked is None:
+            self.checked = Parser(ReplayLexer(self.tokens, self.next_chars)).parse()
+            SemanticAnalyzer().visit(self.checked)
+        interpreter = ENGINES[self.engine](self.checked)
+        return interpreter.interpret
+
+    def parse(self):
+        self.tree = Parser(ReplayLexer(self.tokens, self.next_chars)).parse()
+
+    def time(self, phase, repeat):
+        best = None
+        for _ in range(repeat):
+            run = self.prepare(phase)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def peak_memory(self, phase):
+        run = self.prepare(phase)
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    def measure(self, repeat):
+        node_count = statements = 0
+        results = {}
+        for phase in PHASES:
+            seconds = self.time(phase, repeat)
+            if phase == 'parse':
+                node_count = nodes.count_nodes(self.tree)
+                statements = sum(1 for node in nodes.walk(self.tree)
+                                 if isinstance(node, (nodes.Assign, nodes.ProcedureCall)))
+            count, unit = {
+                'lex': (len(self.tokens), 'tokens'),
+                'parse': (node_count, 'nodes'),
+                'analyze': (node_count, 'nodes'),
+                'execute': (statements, 'statements'),
+            }[phase]
+            results[phase] = {
+                'seconds': seconds,
+                'unit': unit,
+                'per_second': count / seconds,
+                'peak_bytes': self.peak_memory(phase),
+            }
+        return results
+
+
+def compare(results, baseline, threshold):
+    """the regressions of results against baseline, as messages"""
+    regressions = []
+    for name, phases in results.items():
+        for phase, result in phases.items():
+            base = baseline.get('workloads', {}).get(name, {}).get(phase)
+            if base is None:
+                continue
+            slower = base['per_second'] / result['per_second'] - 1
+            if slower > threshold:
+                regressions.append(f'{name} {phase}: {slower:.1%} slower '
+                                   f'({result["per_second"]:,.0f} {result["unit"]}/s, '
+                                   f'baseline {base["per_second"]:,.0f})')
+            bigger = result['peak_bytes'] / max(base['peak_bytes'], 1) - 1
+            if bigger > threshold:
+                regressions.append(f'{name} {phase}: {bigger:.1%} more memory '
+                                   f'({result["peak_bytes"] / 1024:,.0f} KB, '
+                                   f'baseline {base["peak_bytes"] / 1024:,.0f} KB)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='per-phase benchmark suite')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the program sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engine', choices=tuple(ENGINES), default='tree')
+    parser.add_argument('--workload', action='append', choices=tuple(WORKLOADS),
+                        help='run only these workloads (repeatable)')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--baseline', help='compare with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown or memory growth, default 0.10')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.workload or WORKLOADS:
+        options = dict(WORKLOADS[name])
+        options['statements'] = max(1, int(options['statements'] * args.scale))
+        workload = Workload(name, options, args.engine)
+        results[name] = workload.measure(args.repeat)
+        print(f'{name}: {len(workload.text) / 1024:,.0f} KB')
+        for phase, result in results[name].items():
+            print(f'  {phase:>8}: {result["seconds"]:8.3f}s '
+                  f'{result["per_second"]:14,.0f} {result["unit"] + "/s":<13} '
+                  f'peak {result["peak_bytes"] / 1024:10,.0f} KB')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'engine': args.engine,
+                'scale': args.scale,
+                'workloads': results,
+            }, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('engine') != args.engine or baseline.get('scale') != args.scale:
+            print(f'warning: baseline was run with engine {baseline.get("engine")}, '
+                  f'scale {baseline.get("scale")}')
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'no regression beyond {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+benchmark: overhead of the sampling profiler
+
+    python benchmarks/sampling_overhead.py [--statements N] [--repeat N]
+
+runs the tree walker over a generated program without sampling and with
+SamplingProfiler at several intervals, and prints the slowdown and the
+time spent in the signal handler. the handler time is the better number
+on a busy machine, the run times are noisy. the kernel delivers SIGPROF
+at most once per tick (4ms with HZ=250), whatever the interval.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import ProgramGenerator  # noqa: E402
+from interpreter import Interpreter, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from profiling import SamplingProfiler  # noqa: E402
+
+INTERVALS = (0.01, 0.001, 0.0001)  # seconds
+
+
+class TimedProfiler(SamplingProfiler):
+    """adds up the time spent in the handler"""
+
+    def __init__(self, interpreter, interval):
+        super().__init__(interpreter, interval)
+        self.handler_time = 0.0
+
+    def _sample(self, signum, frame):
+        start = time.perf_counter()
+        super()._sample(signum, frame)
+        self.handler_time += time.perf_counter() - start
+
+
+def run(tree, interval=None):
+    """(seconds, samples, seconds in the handler) of one run"""
+    interpreter = Interpreter(tree)
+    if interval is None:
+        start = time.perf_counter()
+        interpreter.interpret()
+        return time.perf_counter() - start, 0, 0.0
+    profiler = TimedProfiler(interpreter, interval)
+    with profiler:
+        start = time.perf_counter()
+        interpreter.interpret()
+        elapsed = time.perf_counter() - start
+    return elapsed, sum(profiler.samples.values()), profiler.handler_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='sampling profiler overhead')
+    parser.add_argument('--statements', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    text = ProgramGenerator(statements=args.statements, depth=5).generate()
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+
+    plain = min(run(tree)[0] for _ in range(args.repeat))
+    print(f'{"no sampling":>16}: {plain:8.3f}s')
+    for interval in INTERVALS:
+        elapsed, samples, handler = min(run(tree, interval) for _ in range(args.repeat))
+        per_sample = handler / samples * 1e6 if samples else 0
+        print(f'{interval * 1000:>10.1f} ms  : {elapsed:8.3f}s  slowdown {elapsed / plain - 1:6.1%}  '
+              f'{samples:5} samples, {per_sample:5.1f}us each, '
+              f'{handler / elapsed:5.2%} of the run in the handler')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+benchmark: requests to a server against a process per request
+
+    python benchmarks/server_overhead.py [--requests N] [--processes N] [--workers N]
+
+times running example.pas with `python main.py example.pas`, a new
+interpreter process per run, and sending it as a request to a
+`main.py --serve` process over a pipe, the requests all written first
+so they are handled concurrently. The server compiles it once per
+worker, the other requests hit the workers' caches.
+"""
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+EXAMPLE = os.path.join(ROOT, 'example.pas')
+TIMEOUT = 120  # seconds to wait for a response, or for a process to exit
+
+
+def per_process(runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, MAIN, EXAMPLE], check=True, stdout=subprocess.DEVNULL,
+                       timeout=TIMEOUT)
+    return (time.perf_counter() - start) / runs
+
+
+def per_request(requests, workers):
+    """(seconds per request, requests served from a worker's cache)"""
+    server = subprocess.Popen(
+        [sys.executable, MAIN, '--serve', '--workers', str(workers)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    # the responses are read by a thread while the requests are
+    # written, '' is the end of them
+    lines = queue.Queue()
+
+    def read():
+        for line in server.stdout:
+            lines.put(line)
+        lines.put('')
+
+    def response():
+        try:
+            return lines.get(timeout=TIMEOUT)
+        except queue.Empty:
+            server.kill()
+            sys.exit(f'the server did not answer in {TIMEOUT}s')
+
+    threading.Thread(target=read, daemon=True).start()
+    # a first request, so the workers are running before the timing
+    server.stdin.write(json.dumps({'id': -1, 'path': EXAMPLE}) + '\n')
+    server.stdin.flush()
+    response()
+
+    start = time.perf_counter()
+    server.stdin.write(''.join(
+        json.dumps({'id': i, 'path': EXAMPLE, 'bindings': {'y': i}}) + '\n'
+        for i in range(requests)
+    ))
+    server.stdin.close()
+    cached = sum(json.loads(response())['cached'] for _ in range(requests))
+    elapsed = time.perf_counter() - start
+    if response() != '':
+        sys.exit('the server answered more requests than it was sent')
+    try:
+        server.wait(TIMEOUT)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        sys.exit(f'the server did not exit in {TIMEOUT}s')
+    return elapsed / requests, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description='server request overhead')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=20, help='runs with a process each')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    spawn = per_process(args.processes)
+    served, cached = per_request(args.requests, workers)
+    print(f'{"process/run":>14}: {spawn * 1e3:8.2f} ms/run')
+    print(f'{"server":>14}: {served * 1e3:8.2f} ms/request  {spawn / served:6.1f}x  '
+          f'({cached} of {args.requests} cached, {workers} workers)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+benchmark: a Session run against the whole pipeline for every run
+
+    python benchmarks/session_overhead.py [--runs N]
+
+times Session.run() on example.pas, and lexing, parsing, analyzing and
+running it from scratch the way main.py does for each file.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from closure import ClosureInterpreter  # noqa: E402
+from interpreter import SemanticAnalyzer  # noqa: E402
+from lexer import Lexer  # noqa: E402
+from parser import Parser  # noqa: E402
+from session import Session  # noqa: E402
+
+
+def from_scratch(text):
+    tree = Parser(Lexer(text)).parse()
+    SemanticAnalyzer().visit(tree)
+    ClosureInterpreter(tree).interpret()
+
+
+def per_run(runs, func, *args):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(*args)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Session run overhead')
+    parser.add_argument('--runs', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'example.pas')) as f:
+        text = f.read()
+    session = Session(text)
+
+    scratch = per_run(args.runs, from_scratch, text)
+    warm = per_run(args.runs, lambda: session.run(y=3))
+    print(f'{"from scratch":>14}: {scratch * 1e6:8.1f} us/run')
+    print(f'{"Session.run":>14}: {warm * 1e6:8.1f} us/run  {scratch / warm:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""
+bytecode
+
+a compiler from the AST into a flat array of instructions, and a
+stack-based virtual machine that runs them in one dispatch loop.
+"""
+import marshal
+import math
+from array import array
+from enum import Enum
+
+import nodes
+from error import ExecutionError
+from interpreter import ActivationRecord, ARType, CallStack, NodeVisitor, RecordPool
+from tokens import TokenType
+from tracing import CALL_STACK, EXECUTION, tracer
+
+# bumped when the instructions or the serialized form change
+BYTECODE_VERSION = 6
+
+# operand of LOAD_OUTER/STORE_OUTER/CALL: depth << DEPTH_SHIFT | slot or index,
+# the operands are 64 bit, a slot or an index has the low 32
+DEPTH_SHIFT = 32
+INDEX_MASK = (1 << DEPTH_SHIFT) - 1
+
+
+class Opcode(Enum):
+    LOAD_CONST = 1  # push consts[arg]
+    LOAD_VAR = 2  # push frame[arg]
+    STORE_VAR = 3  # frame[arg] = pop
+    ADD = 4
+    SUB = 5
+    MUL = 6
+    INT_DIV = 7
+    FLOAT_DIV = 8
+    POS = 9
+    NEG = 10
+    LOAD_OUTER = 11  # push slot of the record depth scopes up
+    STORE_OUTER = 12  # slot of the record depth scopes up = pop
+    CALL = 13  # call procedures[index], declared depth scopes up, its arguments on the stack
+    TO_REAL = 14  # the INTEGER on top of the stack as a REAL
+
+
+BINARY_OPCODES = {
+    TokenType.PLUS: Opcode.ADD,
+    TokenType.MINUS: Opcode.SUB,
+    TokenType.MUL: Opcode.MUL,
+    TokenType.INTEGER_DIV: Opcode.INT_DIV,
+    TokenType.FLOAT_DIV: Opcode.FLOAT_DIV,
+}
+
+UNARY_OPCODES = {
+    TokenType.PLUS: Opcode.POS,
+    TokenType.MINUS: Opcode.NEG,
+    TokenType.REAL: Opcode.TO_REAL,
+}
+
+
+class Code(object):
+    """a compiled program or procedure
+
+    instructions are (opcode, operand) pairs in one array('q'), the
+    operand of LOAD_CONST is an index in the constant pool and the one
+    of LOAD_VAR/STORE_VAR a slot of the activation record, names holds
+    the name of every slot, the parameters first.
+    the program's Code holds the Code of all the procedures, CALL
+    operands are indexes in that list.
+    """
+
+    def __init__(self, name, instructions=None, consts=None, names=None,
+                 argcount=0, nesting_level=1, procedures=None):
+        self.name = name  # program or procedure name
+        self.instructions = instructions if instructions is not None else array('q')
+        self.consts = consts if consts is not None else []  # constant pool
+        self.names = names if names is not None else []  # slot -> variable name
+        self.argcount = argcount  # number of parameters
+        self.nesting_level = nesting_level
+        self.procedures = procedures if procedures is not None else []
+
+    def _fields(self):
+        return (
+            self.name,
+            self.instructions.tobytes(),
+            tuple(self.consts),
+            tuple(self.names),
+            self.argcount,
+            self.nesting_level,
+        )
+
+    @classmethod
+    def _from_fields(cls, fields):
+        name, instructions, consts, names, argcount, nesting_level = fields
+        code = array('q')
+        code.frombytes(instructions)
+        return cls(name, code, list(consts), list(names), argcount, nesting_level)
+
+    def to_bytes(self):
+        return marshal.dumps((
+            BYTECODE_VERSION,
+            self._fields(),
+            tuple(procedure._fields() for procedure in self.procedures),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        fields = marshal.loads(data)
+        if fields[0] != BYTECODE_VERSION:
+            raise ValueError(f'bytecode version {fields[0]}, expected {BYTECODE_VERSION}')
+        _, program, procedures = fields
+        code = cls._from_fields(program)
+        code.procedures = [cls._from_fields(procedure) for procedure in procedures]
+        return code
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    compiler     ----------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+class Compiler(NodeVisitor):
+    """compile the AST of a program into a Code, the tree must be checked
+    by the semantic analyzer, it gives the variables their slots
+    """
+
+    def __init__(self):
+        self.program = None
+        self.code = None  # the Code being compiled
+        self.const_index = {}  # (type, value) -> index in its constant pool
+        self.procedure_index = {}  # ProcedureDecl -> index in program.procedures
+
+    def compile(self, tree):
+        self.visit(tree)
+        return self.program
+
+    def emit(self, opcode, arg=0):
+        self.code.instructions.extend((opcode.value, arg))
+
+    def const(self, value):
+        # 1 and 1.0 are equal keys, so the type is part of the key, and
+        # 0.0 and -0.0 too, so the sign of a float is
+        key = (type(value), value)
+        if type(value) is float:
+            key += (math.copysign(1.0, value),)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.code.consts)
+            self.code.consts.append(value)
+        return self.const_index[key]
+
+    def visit_Program(self, node):
+        self.program = self.code = Code(node.name, names=list(node.var_slots))
+        self.visit(node.block)
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        self.visit(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        code = Code(
+            node.proc_name,
+            names=list(node.var_slots),
+            argcount=len(node.params),
+            nesting_level=self.code.nesting_level + 1,
+        )
+        # the index exists before the block is compiled, for recursive calls
+        self.procedure_index[node] = len(self.program.procedures)
+        self.program.procedures.append(code)
+
+        outer = self.code, self.const_index
+        self.code, self.const_index = code, {}
+        self.visit(node.block_node)
+        self.code, self.const_index = outer
+
+    def visit_ProcedureCall(self, node):
+        for param in node.actual_params:
+            self.visit(param)
+        index = self.procedure_index[node.proc_symbol.decl]
+        self.emit(Opcode.CALL, node.depth << DEPTH_SHIFT | index)
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_Assign(self, node):
+        self.visit(node.right)
+        var = node.left
+        if var.depth:
+            self.emit(Opcode.STORE_OUTER, var.depth << DEPTH_SHIFT | var.slot)
+        else:
+            self.emit(Opcode.STORE_VAR, var.slot)
+
+    def visit_Var(self, node):
+        if node.depth:
+            self.emit(Opcode.LOAD_OUTER, node.depth << DEPTH_SHIFT | node.slot)
+        else:
+            self.emit(Opcode.LOAD_VAR, node.slot)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Num(self, node):
+        self.emit(Opcode.LOAD_CONST, self.const(node.value))
+
+    def visit_BinOp(self, node):
+        # post order with an explicit stack, an expression can be nested
+        # deeper than the recursion limit
+        todo = [(node, False)]  # (node, operands emitted)
+        while todo:
+            node, ready = todo.pop()
+            if node.__class__ is nodes.BinOp:
+                if ready:
+                    self.emit(BINARY_OPCODES[node.op.type])
+                else:
+                    todo.append((node, True))
+                    todo.append((node.right, False))
+                    todo.append((node.left, False))
+            elif node.__class__ is nodes.UnaryOp:
+                if ready:
+                    self.emit(UNARY_OPCODES[node.op.type])
+                else:
+                    todo.append((node, True))
+                    todo.append((node.expr, False))
+            else:
+                self.visit(node)
+
+    visit_UnaryOp = visit_BinOp
+
+
+def disassemble(code):
+    """readable listing of the instructions, of the program then of
+    each procedure
+    """
+    lines = []
+    for unit in [code] + code.procedures:
+        if lines:
+            lines.append('')
+        lines.append(f'Disassembly of {unit.name}:')
+        instructions = unit.instructions
+        for pc in range(0, len(instructions), 2):
+            opcode = Opcode(instructions[pc])
+            arg = instructions[pc + 1]
+            if opcode == Opcode.LOAD_CONST:
+                detail = f'{arg:>4} ({unit.consts[arg]!r})'
+            elif opcode in (Opcode.LOAD_VAR, Opcode.STORE_VAR):
+                detail = f'{arg:>4} ({unit.names[arg]})'
+            elif opcode in (Opcode.LOAD_OUTER, Opcode.STORE_OUTER):
+                detail = f'{arg & INDEX_MASK:>4} (depth {arg >> DEPTH_SHIFT})'
+            elif opcode == Opcode.CALL:
+                index = arg & INDEX_MASK
+                detail = f'{index:>4} ({code.procedures[index].name}, depth {arg >> DEPTH_SHIFT})'
+            else:
+                detail = ''
+            lines.append(f'{pc:>6} {opcode.name:<12}{detail}'.rstrip())
+    return '\n'.join(lines)
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    virtual machine     ---------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+LOAD_CONST = Opcode.LOAD_CONST.value
+LOAD_VAR = Opcode.LOAD_VAR.value
+STORE_VAR = Opcode.STORE_VAR.value
+ADD = Opcode.ADD.value
+SUB = Opcode.SUB.value
+MUL = Opcode.MUL.value
+INT_DIV = Opcode.INT_DIV.value
+FLOAT_DIV = Opcode.FLOAT_DIV.value
+POS = Opcode.POS.value
+NEG = Opcode.NEG.value
+LOAD_OUTER = Opcode.LOAD_OUTER.value
+STORE_OUTER = Opcode.STORE_OUTER.value
+CALL = Opcode.CALL.value
+TO_REAL = Opcode.TO_REAL.value
+
+
+class VM(object):
+    """stack-based virtual machine, it has the same interface as
+    Interpreter and keeps the program's ActivationRecord on the
+    CallStack
+    """
+
+    def __init__(self, code):
+        self.code = code
+        self.call_stack = CallStack()
+        # a RecordPool for each procedure, by index
+        self.pools = [
+            RecordPool(procedure.name, procedure.nesting_level,
+                       {name: slot for slot, name in enumerate(procedure.names)})
+            for procedure in code.procedures
+        ] if code is not None else []
+
+    def interpret(self):
+        code = self.code
+        if code is None:
+            return ''
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'enter', f'ENTER: PROGRAM {code.name}',
+                        type='PROGRAM', name=code.name)
+        ar = ActivationRecord(
+            name=code.name,
+            type=ARType.PROGRAM,
+            nesting_level=1,
+            var_slots={name: slot for slot, name in enumerate(code.names)},
+        )
+        self.call_stack.push(ar)
+
+        try:
+            self.run(code, ar)
+        except (ArithmeticError, RecursionError) as e:
+            # the instructions do not keep the tokens they come from
+            raise ExecutionError.from_exception(e, None) from e
+
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'leave', f'LEAVE: PROGRAM {code.name}',
+                        type='PROGRAM', name=code.name)
+        if tracer.callstack:
+            tracer.emit(CALL_STACK, 'dump', str(self.call_stack), records=self.call_stack.to_list())
+        self.call_stack.pop()
+
+    def run(self, code, ar):
+        """the dispatch loop, for the code of the program or a procedure
+        and its activation record
+        """
+        instructions = code.instructions
+        consts = code.consts
+        frame = ar.slots
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        pc = 0
+        end = len(instructions)
+        while pc < end:
+            opcode = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+            if opcode == LOAD_VAR:
+                push(frame[arg])
+            elif opcode == LOAD_CONST:
+                push(consts[arg])
+            elif opcode == STORE_VAR:
+                frame[arg] = pop()
+            elif opcode == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif opcode == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif opcode == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif opcode == INT_DIV:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif opcode == FLOAT_DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif opcode == NEG:
+                stack[-1] = -stack[-1]
+            elif opcode == POS:
+                stack[-1] = +stack[-1]
+            elif opcode == LOAD_OUTER:
+                outer = ar
+                for _ in range(arg >> DEPTH_SHIFT):
+                    outer = outer.enclosing
+                push(outer.slots[arg & INDEX_MASK])
+            elif opcode == STORE_OUTER:
+                outer = ar
+                for _ in range(arg >> DEPTH_SHIFT):
+                    outer = outer.enclosing
+                outer.slots[arg & INDEX_MASK] = pop()
+            elif opcode == CALL:
+                self.call(arg, ar, stack)
+            elif opcode == TO_REAL:
+                stack[-1] = float(stack[-1])
+            else:
+                raise RuntimeError(f'unknown opcode {opcode} at {pc - 2}')
+
+    def call(self, arg, caller, stack):
+        index = arg & INDEX_MASK
+        procedure = self.code.procedures[index]
+        pool = self.pools[index]
+        enclosing = caller
+        for _ in range(arg >> DEPTH_SHIFT):
+            enclosing = enclosing.enclosing
+        ar = pool.acquire(enclosing)
+        # the arguments are on the stack, in parameter order
+        argcount = procedure.argcount
+        if argcount:
+            ar.slots[:argcount] = stack[-argcount:]
+            del stack[-argcount:]
+
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'enter', f'ENTER: PROCEDURE {procedure.name}',
+                        type='PROCEDURE', name=procedure.name)
+        self.call_stack.push(ar)
+        # the record is popped and released when the body raises too
+        try:
+            self.run(procedure, ar)
+            if tracer.execution:
+                tracer.emit(EXECUTION, 'leave', f'LEAVE: PROCEDURE {procedure.name}',
+                            type='PROCEDURE', name=procedure.name)
+            if tracer.callstack:
+                tracer.emit(CALL_STACK, 'dump', str(self.call_stack), records=self.call_stack.to_list())
+        finally:
+            self.call_stack.pop()
+            pool.release(ar)
@@ -0,0 +1,177 @@
+"""
+Cache
+checked programs kept on disk, like __pycache__, so running the same
+program again skips lexing, parsing and semantic analysis
+
+__nancache__/<file name>.<source hash>.<tag>.<kind> holds a header line,
+the sha256 of the source it was made from and the zlib compressed
+payload. the entries are keyed by the hash of the source, so files of
+the same name sharing a cache directory keep an entry each. in the
+__nancache__ next to a file, the entries of its older versions are
+removed when a new one is stored. the tag is a hash of the modules that
+make the entries, so a change to any of them is a miss
+"""
+import gc
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+import zlib
+
+from bytecode import Code
+
+CACHE_DIR = '__nancache__'
+MAGIC = b'NANC1\n'
+
+# the modules whose code decides what a tree or its bytecode is
+COMPILER_MODULES = ('tokens', 'lexer', 'nodes', 'parser', 'interpreter', 'optimizer', 'bytecode', 'cache')
+
+
+def _compiler_hash():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in COMPILER_MODULES:
+        with open(os.path.join(directory, name + '.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+TAG = f'nan-{_compiler_hash()}-py{sys.version_info[0]}{sys.version_info[1]}'
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest()
+
+
+class ProgramCache(object):
+    """entries for the programs in the directory of each source file,
+    or all in one directory
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.hits = self.misses = 0
+
+    def path(self, filename, text, kind):
+        directory = self.directory
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR)
+        key = source_hash(text).hex()[:32]
+        return os.path.join(directory, f'{os.path.basename(filename)}.{key}.{TAG}.{kind}')
+
+    def load(self, filename, text, kind='ast'):
+        """the payload stored for this source, or None"""
+        try:
+            with open(self.path(filename, text, kind), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        header = len(MAGIC) + hashlib.sha256().digest_size
+        if data[:len(MAGIC)] != MAGIC or data[len(MAGIC):header] != source_hash(text):
+            self.misses += 1
+            return None
+        try:
+            payload = zlib.decompress(data[header:])
+        except zlib.error:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def store(self, filename, text, payload, kind='ast'):
+        """write the entry to a temporary file and rename it in place,
+        so a concurrent run reads either the old entry or the new one.
+        the cache is only an optimization: failing to write it is ignored
+        """
+        path = self.path(filename, text, kind)
+        data = MAGIC + source_hash(text) + zlib.compress(payload)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        except OSError:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            return False
+        if self.directory is None:
+            self.prune(filename, path, kind)
+        return True
+
+    def prune(self, filename, path, kind):
+        """remove the other entries of filename's kind, for its older
+        versions or older compilers: in the __nancache__ next to a file
+        only that file has its name
+        """
+        directory, name = os.path.split(path)
+        entry = re.compile(
+            re.escape(os.path.basename(filename)) + r'\.[0-9a-f]{32}\.nan-[0-9a-f]{16}'
+            + re.escape(f'-py{sys.version_info[0]}{sys.version_info[1]}.{kind}')
+        )
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for other in names:
+            if other != name and entry.fullmatch(other):
+                try:
+                    os.unlink(os.path.join(directory, other))
+                except OSError:
+                    pass
+
+    def load_tree(self, filename, text):
+        payload = self.load(filename, text, 'ast')
+        if payload is None:
+            return None
+        # a tree is hundreds of thousands of small objects, with the
+        # collector on, unpickling is ten times slower
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(payload)
+        except Exception:
+            # written by an incompatible version of the node classes
+            self.hits -= 1
+            self.misses += 1
+            return None
+        finally:
+            if enabled:
+                gc.enable()
+
+    def store_tree(self, filename, text, tree):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            payload = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # too deeply nested to pickle, run it uncached
+            return False
+        finally:
+            if enabled:
+                gc.enable()
+        return self.store(filename, text, payload, 'ast')
+
+    def load_code(self, filename, text, kind='bytecode'):
+        payload = self.load(filename, text, kind)
+        if payload is None:
+            return None
+        try:
+            return Code.from_bytes(payload)
+        except ValueError:
+            # compiled by another bytecode version
+            self.hits -= 1
+            self.misses += 1
+            return None
+
+    def store_code(self, filename, text, code, kind='bytecode'):
+        return self.store(filename, text, code.to_bytes(), kind)
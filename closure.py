@@ -0,0 +1,304 @@
+"""
+closure compiler
+
+every AST node is compiled once into a nested Python closure, operators
+are chosen and variables resolved to frame slots at compile time, so
+running the program is calling the root closure.
+
+a frame is the slots list of an activation record: the variables, then
+the frame of the enclosing scope (the access link, None for the program)
+and the call stack.
+"""
+import operator
+
+import nodes
+from error import ExecutionError
+from interpreter import (
+    ActivationRecord, ARType, BINARY_OPERATORS, CallStack, NodeVisitor, RecordPool, UNARY_OPERATORS,
+)
+from tracing import CALL_STACK, EXECUTION, tracer
+
+# an expression nested deeper than this is compiled into one closure
+# that walks it with an explicit stack, nested closures would recurse
+# once per level to compile and to run
+MAX_NESTING = 100
+
+
+class ClosureCompiler(NodeVisitor):
+    """compile the AST into closures, every closure takes the frame
+    (the slots of the program's activation record). The tree must be
+    checked by the semantic analyzer, it gives the variables their slots.
+    """
+
+    def __init__(self):
+        self.frame_sizes = []  # variables of the scopes being compiled, outermost first
+        self.bodies = {}  # ProcedureDecl -> [its compiled block], filled once compiled
+
+    def compile(self, tree):
+        """compile the program, return the root closure"""
+        return self.visit(tree)
+
+    def links(self, depth):
+        """the indexes of the access links followed to go depth scopes up"""
+        return tuple(self.frame_sizes[-1 - i] for i in range(depth))
+
+    def visit_Program(self, node):
+        program_name = node.name
+        var_slots = node.var_slots
+        size = len(var_slots)
+        self.frame_sizes.append(size)
+        block = self.visit(node.block)
+        self.frame_sizes.pop()
+
+        def program(call_stack, ar=None):
+            # ar: a record made by the caller, with variables already set
+            if tracer.execution:
+                tracer.emit(EXECUTION, 'enter', f'ENTER: PROGRAM {program_name}',
+                            type='PROGRAM', name=program_name)
+            if ar is None:
+                ar = ActivationRecord(
+                    name=program_name,
+                    type=ARType.PROGRAM,
+                    nesting_level=1,
+                    var_slots=var_slots,
+                )
+            call_stack.push(ar)
+
+            frame = ar.slots
+            frame.extend((None, call_stack))
+            try:
+                block(frame)
+            finally:
+                del frame[size:]
+
+            if tracer.execution:
+                tracer.emit(EXECUTION, 'leave', f'LEAVE: PROGRAM {program_name}',
+                            type='PROGRAM', name=program_name)
+            if tracer.callstack:
+                tracer.emit(CALL_STACK, 'dump', str(call_stack), records=call_stack.to_list())
+            call_stack.pop()
+
+        return program
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        return self.visit(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        # the cell exists before the block is compiled, for recursive calls
+        cell = self.bodies[node] = [None]
+        self.frame_sizes.append(len(node.var_slots))
+        cell[0] = self.visit(node.block_node)
+        self.frame_sizes.pop()
+
+    def visit_ProcedureCall(self, node):
+        proc_symbol = node.proc_symbol
+        decl = proc_symbol.decl
+        proc_name = decl.proc_name
+        token = node.token
+        body = self.bodies[decl]
+        args = tuple(enumerate(map(self.visit, node.actual_params)))
+        links = self.links(node.depth)
+        # where the caller's frame keeps the call stack, and the callee's its link
+        stack_index = self.frame_sizes[-1] + 1
+        link_index = len(decl.var_slots)
+        pool = RecordPool(proc_name, proc_symbol.scope_level + 1, decl.var_slots, extra=2)
+
+        def call(frame):
+            enclosing = frame
+            for link in links:
+                enclosing = enclosing[link]
+            ar = pool.acquire(None)
+            slots = ar.slots
+            try:
+                for slot, arg in args:
+                    slots[slot] = arg(frame)
+            except ArithmeticError as e:
+                pool.release(ar)
+                raise ExecutionError.from_exception(e, token) from e
+            call_stack = frame[stack_index]
+            slots[link_index] = enclosing
+            slots[link_index + 1] = call_stack
+
+            if tracer.execution:
+                tracer.emit(EXECUTION, 'enter', f'ENTER: PROCEDURE {proc_name}',
+                            type='PROCEDURE', name=proc_name)
+            call_stack.push(ar)
+            # the record is popped and released when the body raises too
+            try:
+                try:
+                    body[0](slots)
+                except RecursionError as e:
+                    raise ExecutionError.from_exception(e, token) from e
+
+                if tracer.execution:
+                    tracer.emit(EXECUTION, 'leave', f'LEAVE: PROCEDURE {proc_name}',
+                                type='PROCEDURE', name=proc_name)
+                if tracer.callstack:
+                    tracer.emit(CALL_STACK, 'dump', str(call_stack), records=call_stack.to_list())
+            finally:
+                call_stack.pop()
+                pool.release(ar)
+
+        return call
+
+    def visit_Compound(self, node):
+        statements = tuple(
+            statement for statement in map(self.visit, node.children)
+            if statement is not None
+        )
+
+        def compound(frame):
+            for statement in statements:
+                statement(frame)
+
+        return compound
+
+    def visit_Assign(self, node):
+        value = self.visit(node.right)
+        slot = node.left.slot
+        token = node.left.token
+        links = self.links(node.left.depth)
+
+        if links:
+            def assign(frame):
+                try:
+                    result = value(frame)
+                except ArithmeticError as e:
+                    raise ExecutionError.from_exception(e, token) from e
+                for link in links:
+                    frame = frame[link]
+                frame[slot] = result
+        else:
+            def assign(frame):
+                try:
+                    frame[slot] = value(frame)
+                except ArithmeticError as e:
+                    raise ExecutionError.from_exception(e, token) from e
+
+        return assign
+
+    def visit_Var(self, node):
+        slot = node.slot
+        links = self.links(node.depth)
+        if not links:
+            return operator.itemgetter(slot)
+
+        def var(frame):
+            for link in links:
+                frame = frame[link]
+            return frame[slot]
+
+        return var
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Num(self, node):
+        value = node.value
+
+        def num(frame):
+            return value
+
+        return num
+
+    def visit_BinOp(self, node):
+        if _deeper(node, MAX_NESTING):
+            return self.postfix(node)
+        op = BINARY_OPERATORS[node.op.type]
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        # a constant operand is bound directly
+        if isinstance(node.right, nodes.Num):
+            right_value = node.right.value
+
+            def binop(frame):
+                return op(left(frame), right_value)
+        else:
+            def binop(frame):
+                return op(left(frame), right(frame))
+
+        return binop
+
+    def visit_UnaryOp(self, node):
+        if _deeper(node, MAX_NESTING):
+            return self.postfix(node)
+        op = UNARY_OPERATORS[node.op.type]
+        expr = self.visit(node.expr)
+
+        def unaryop(frame):
+            return op(expr(frame))
+
+        return unaryop
+
+    def postfix(self, node):
+        """a deep expression as one closure: the operands and operators
+        in post order, (0, the closure of an operand), (1, a unary
+        operator) or (2, a binary one), run on a stack of values
+        """
+        code = []
+        todo = [node]
+        while todo:
+            node = todo.pop()
+            if node.__class__ is nodes.BinOp:
+                todo.append((2, BINARY_OPERATORS[node.op.type]))
+                todo.append(node.right)
+                todo.append(node.left)
+            elif node.__class__ is nodes.UnaryOp:
+                todo.append((1, UNARY_OPERATORS[node.op.type]))
+                todo.append(node.expr)
+            elif node.__class__ is tuple:
+                code.append(node)
+            else:
+                code.append((0, self.visit(node)))
+        code = tuple(code)
+
+        def expression(frame):
+            values = []
+            for arity, function in code:
+                if arity == 2:
+                    right = values.pop()
+                    values[-1] = function(values[-1], right)
+                elif arity:
+                    values[-1] = function(values[-1])
+                else:
+                    values.append(function(frame))
+            return values[0]
+
+        return expression
+
+
+def _deeper(node, limit):
+    """the expression has more than limit nested operators"""
+    todo = [(node, 1)]
+    while todo:
+        node, depth = todo.pop()
+        if depth > limit:
+            return True
+        if node.__class__ is nodes.BinOp:
+            todo.append((node.left, depth + 1))
+            todo.append((node.right, depth + 1))
+        elif node.__class__ is nodes.UnaryOp:
+            todo.append((node.expr, depth + 1))
+    return False
+
+
+class ClosureInterpreter(object):
+    """run the program compiled into closures, it has the same
+    interface as Interpreter
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.call_stack = CallStack()
+        self.program = ClosureCompiler().compile(tree) if tree is not None else None
+
+    def interpret(self):
+        if self.program is None:
+            return ''
+        return self.program(self.call_stack)
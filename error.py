@@ -7,6 +7,9 @@ class ErrorCode(Enum):
     UNEXPECTED_TOKEN = 'Unexpected token'
     ID_NOT_FOUND = 'Identifier not found'
     DUPLICATE_ID = 'Duplicate id found'
+    WRONG_PARAMS_NUM = 'Wrong number of arguments'
+    TYPE_MISMATCH = 'Type mismatch'
+    RUNTIME_ERROR = 'Runtime error'
 
 
 class Error(Exception):
@@ -15,6 +18,16 @@ class Error(Exception):
         self.token = token  # token
         self.message = f'{self.__class__.__name__}: {message}'  # error message
 
+    @property
+    def lineno(self):
+        """line number of the token, computed on demand"""
+        return self.token.lineno if self.token is not None else None
+
+    @property
+    def column(self):
+        """column number of the token, computed on demand"""
+        return self.token.column if self.token is not None else None
+
 
 class LexerError(Error):
     pass
@@ -26,3 +39,15 @@ class ParserError(Error):
 
 class SemanticError(Error):
     pass
+
+
+class ExecutionError(Error):
+    @classmethod
+    def from_exception(cls, exc, token):
+        """the error for a Python exception raised by the program"""
+        error_code = ErrorCode.RUNTIME_ERROR
+        return cls(
+            error_code=error_code,
+            token=token,
+            message=f'{error_code.value} ({exc}) -> {token}',
+        )
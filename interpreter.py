@@ -1,12 +1,36 @@
 """
 解释器
 """
+__version__ = '0.6.0'
 
+import math
+import operator
 from collections import OrderedDict
 from enum import Enum
 
-from error import SemanticError, ErrorCode
-from token import TokenType
+import nodes
+from error import ErrorCode, ExecutionError, SemanticError
+from tokens import Token, TokenType
+from tracing import CALL_STACK, EXECUTION, LOOKUP, SCOPE, tracer
+
+# the operands have the types the semantic analyzer checked, so the
+# operators need no conversion: DIV only gets INTEGERs, and python's /
+# gives a float for any mix of int and float
+BINARY_OPERATORS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.MUL: operator.mul,
+    TokenType.INTEGER_DIV: operator.floordiv,
+    TokenType.FLOAT_DIV: operator.truediv,
+}
+
+UNARY_OPERATORS = {
+    TokenType.PLUS: operator.pos,
+    TokenType.MINUS: operator.neg,
+    # the conversion the semantic analyzer adds where an INTEGER
+    # is stored in a REAL, so a REAL always holds a float
+    TokenType.REAL: float,
+}
 
 """""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
 --------------------    ast node visitor    --------------------    
@@ -14,11 +38,27 @@ from token import TokenType
 
 
 class NodeVisitor(object):
+    # node class -> visit method, per visitor class
+    _visitors = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visitors = {}
+
     def visit(self, node):
-        # awesome
-        method_name = 'visit_' + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        # the method is resolved once per (visitor class, node class)
+        try:
+            visitor = self._visitors[node.__class__]
+        except KeyError:
+            visitor = self._resolve_visitor(node.__class__)
+        return visitor(self, node)
+
+    @classmethod
+    def _resolve_visitor(cls, node_class):
+        method_name = 'visit_' + node_class.__name__
+        visitor = getattr(cls, method_name, cls.generic_visit)
+        cls._visitors[node_class] = visitor
+        return visitor
 
     def generic_visit(self, node):
         raise Exception('No visit_{} method'.format(type(node).__name__))
@@ -52,6 +92,8 @@ class BuiltinTypeSymbol(Symbol):
 class VarSymbol(Symbol):
     def __init__(self, name, type):
         super().__init__(name, type)
+        self.scope_level = None  # level of the scope it's declared in
+        self.slot = None  # index in the activation record of that scope
 
     def __str__(self):
         return "<{class_name}(name='{name}', type='{type}')>".format(
@@ -63,10 +105,22 @@ class VarSymbol(Symbol):
     __repr__ = __str__
 
 
+INTEGER = 'INTEGER'
+REAL = 'REAL'
+
+# the builtin types, they never change, so every global scope shares them
+BUILTIN_TYPES = (
+    BuiltinTypeSymbol(INTEGER),
+    BuiltinTypeSymbol(REAL),
+)
+
+
 class ProcedureSymbol(Symbol):
     def __init__(self, name, params=None):
         super().__init__(name)
         self.params = params if params is not None else []
+        self.scope_level = None  # level of the scope it's declared in
+        self.decl = None  # its ProcedureDecl, what a call runs
 
     def __str__(self):
         return '<{class_name}(name={name}, parameters={params})>'.format(
@@ -86,13 +140,14 @@ class ScopedSymbolTable(object):
         self.scope_name = scope_name  # scope name
         self.scope_level = scope_level  # scope level
         self.enclosing_scope = enclosing_scope
+        self.var_slots = {}  # variable name -> slot, in declaration order
 
     def _init_builtins(self):
         """built in type
         INTEGER & REAL
         """
-        self.insert(BuiltinTypeSymbol('INTEGER'))
-        self.insert(BuiltinTypeSymbol('REAL'))
+        for symbol in BUILTIN_TYPES:
+            self.insert(symbol)
 
     def __str__(self):
         h1 = 'SCOPE (SCOPED SYMBOL TABLE)'
@@ -115,16 +170,32 @@ class ScopedSymbolTable(object):
 
     __repr__ = __str__
 
+    def to_dict(self):
+        return {
+            'scope': self.scope_name,
+            'level': self.scope_level,
+            'enclosing_scope': self.enclosing_scope.scope_name if self.enclosing_scope else None,
+            'symbols': {key: repr(value) for key, value in self._symbols.items()},
+        }
+
     def insert(self, symbol):
         """insert a symbol"""
 
-        print('Insert: %s' % symbol.name)
+        if tracer.scope:
+            tracer.emit(SCOPE, 'insert', 'Insert: %s' % symbol.name,
+                        name=symbol.name, scope=self.scope_name)
         self._symbols[symbol.name] = symbol
+        # variables get the next slot of the scope's activation record
+        if isinstance(symbol, VarSymbol):
+            symbol.scope_level = self.scope_level
+            symbol.slot = self.var_slots.setdefault(symbol.name, len(self.var_slots))
 
     def lookup(self, name, current_scope_only=False):
         """find symbol if existed"""
 
-        print('Lookup: %s. (Scope name: %s)' % (name, self.scope_name))
+        if tracer.lookup:
+            tracer.emit(LOOKUP, 'lookup', 'Lookup: %s. (Scope name: %s)' % (name, self.scope_name),
+                        name=name, scope=self.scope_name)
         symbol = self._symbols.get(name)
         if symbol is not None:
             return symbol
@@ -144,16 +215,23 @@ class ScopedSymbolTable(object):
 class SemanticAnalyzer(NodeVisitor):
     def __init__(self):
         self.current_scope = None
+        self.procedures = []  # the ProcedureDecls being analyzed, innermost last
+
+    def impure(self):
+        """the procedure being analyzed has a side effect"""
+        if self.procedures:
+            self.procedures[-1].pure = False
 
     def error(self, error_code, token):
-        return SemanticError(
+        raise SemanticError(
             error_code=error_code,
             token=token,
             message=f'{error_code.value} -> {token}',
         )
 
     def visit_Program(self, node):
-        print('ENTER scope: global')
+        if tracer.scope:
+            tracer.emit(SCOPE, 'enter', 'ENTER scope: global', scope='global')
         global_scope = ScopedSymbolTable(
             scope_name='global',
             scope_level=1,
@@ -164,10 +242,13 @@ class SemanticAnalyzer(NodeVisitor):
 
         # visit sub block
         self.visit(node.block)
+        node.var_slots = global_scope.var_slots
 
-        print(global_scope)
+        if tracer.scope:
+            tracer.emit(SCOPE, 'table', str(global_scope), **global_scope.to_dict())
         self.current_scope = self.current_scope.enclosing_scope
-        print('LEAVE scope: global')
+        if tracer.scope:
+            tracer.emit(SCOPE, 'leave', 'LEAVE scope: global', scope='global')
 
     def visit_Block(self, node):
         for declaration in node.declarations:
@@ -194,10 +275,20 @@ class SemanticAnalyzer(NodeVisitor):
     def visit_ProcedureDecl(self, node):
         proc_name = node.proc_name
         proc_symbol = ProcedureSymbol(proc_name)
+        proc_symbol.scope_level = self.current_scope.scope_level
+        proc_symbol.decl = node
+
+        # a procedure is declared once, and not over a variable of its scope
+        if self.current_scope.lookup(proc_name, current_scope_only=True):
+            self.error(
+                error_code=ErrorCode.DUPLICATE_ID,
+                token=node.token,
+            )
         # insert current scope
         self.current_scope.insert(proc_symbol)
 
-        print(f'ENTER scope: {proc_name}')
+        if tracer.scope:
+            tracer.emit(SCOPE, 'enter', f'ENTER scope: {proc_name}', scope=proc_name)
 
         # Scope for parameters and local variables
         procedure_scope = ScopedSymbolTable(
@@ -214,18 +305,51 @@ class SemanticAnalyzer(NodeVisitor):
             param_type = self.current_scope.lookup(param.type_node.value)
             param_name = param.var_node.value
             var_symbol = VarSymbol(param_name, param_type)
+
+            # the arguments are bound by position, a name twice would
+            # give two parameters one slot
+            if self.current_scope.lookup(param_name, current_scope_only=True):
+                self.error(
+                    error_code=ErrorCode.DUPLICATE_ID,
+                    token=param.var_node.token,
+                )
             self.current_scope.insert(var_symbol)
             proc_symbol.params.append(var_symbol)
 
+        # pure until a statement says otherwise, None while it is not
+        # known, calls to it in the meantime are recursive
+        node.pure = None
+        self.procedures.append(node)
         self.visit(node.block_node)
+        self.procedures.pop()
+        node.pure = node.pure is None
+        node.var_slots = procedure_scope.var_slots
 
-        print(procedure_scope)
+        if tracer.scope:
+            tracer.emit(SCOPE, 'table', str(procedure_scope), **procedure_scope.to_dict())
         self.current_scope = self.current_scope.enclosing_scope
-        print(f'LEAVE scope: %s {proc_name}')
+        if tracer.scope:
+            tracer.emit(SCOPE, 'leave', f'LEAVE scope: {proc_name}', scope=proc_name)
 
     def visit_ProcedureCall(self, node):
-        for param_node in node.actual_params:
+        proc_symbol = self.current_scope.lookup(node.proc_name)
+        if not isinstance(proc_symbol, ProcedureSymbol):
+            self.error(error_code=ErrorCode.ID_NOT_FOUND, token=node.token)
+        if len(node.actual_params) != len(proc_symbol.params):
+            self.error(error_code=ErrorCode.WRONG_PARAMS_NUM, token=node.token)
+
+        for i, (param_node, param_symbol) in enumerate(zip(node.actual_params, proc_symbol.params)):
             self.visit(param_node)
+            # a REAL argument can not be bound to an INTEGER parameter
+            if param_symbol.type.name == INTEGER and param_node.type == REAL:
+                self.error(error_code=ErrorCode.TYPE_MISMATCH, token=param_node.token)
+            if param_symbol.type.name == REAL and param_node.type == INTEGER:
+                node.actual_params[i] = self.widen(param_node)
+
+        node.proc_symbol = proc_symbol
+        node.depth = self.current_scope.scope_level - proc_symbol.scope_level
+        if not proc_symbol.decl.pure:
+            self.impure()
 
     def visit_Compound(self, node):
         for child in node.children:
@@ -234,6 +358,30 @@ class SemanticAnalyzer(NodeVisitor):
     def visit_Assign(self, node):
         self.visit(node.right)
         self.visit(node.left)
+        # an INTEGER variable can not hold a REAL
+        if node.left.type == INTEGER and node.right.type == REAL:
+            self.error(error_code=ErrorCode.TYPE_MISMATCH, token=node.left.token)
+        if node.left.type == REAL and node.right.type == INTEGER:
+            node.right = self.widen(node.right)
+
+    def widen(self, node):
+        """an INTEGER expression stored in a REAL, as a REAL expression:
+        a literal is converted now, the others are converted at run time
+        """
+        token = node.token
+        if node.__class__ is nodes.Num:
+            try:
+                value = float(node.value)
+            except OverflowError:
+                # too large for a float, left for the run time error
+                pass
+            else:
+                num = nodes.Num(Token(TokenType.REAL_CONST, value, token.offset, token.lines))
+                num.type = REAL
+                return num
+        conversion = nodes.UnaryOp(Token(TokenType.REAL, TokenType.REAL.value, token.offset, token.lines), node)
+        conversion.type = REAL
+        return conversion
 
     def visit_Var(self, node):
         var_name = node.value
@@ -242,18 +390,60 @@ class SemanticAnalyzer(NodeVisitor):
         var_symbol = self.current_scope.lookup(var_name)
 
         # can not find this var define
-        if var_symbol is None:
+        if not isinstance(var_symbol, VarSymbol):
             self.error(error_code=ErrorCode.ID_NOT_FOUND, token=node.token)
 
+        # lexical address: how many scopes up, and the slot there
+        node.depth = self.current_scope.scope_level - var_symbol.scope_level
+        node.slot = var_symbol.slot
+        node.type = var_symbol.type.name
+        # a variable of an enclosing scope, read or written
+        if node.depth:
+            self.impure()
+
     def visit_Num(self, node):
-        pass
+        node.type = INTEGER if node.token.type == TokenType.INTEGER_CONST else REAL
 
     def visit_BinOp(self, node):
-        self.visit(node.left)
-        self.visit(node.right)
+        """infer the type of every node of the expression
 
-    def visit_UnaryOp(self, node):
-        pass
+        the operators are walked in post order with an explicit stack,
+        an expression can be nested deeper than the recursion limit
+        """
+        todo = [(node, False)]  # (node, operands typed)
+        while todo:
+            node, ready = todo.pop()
+            if node.__class__ is nodes.BinOp:
+                if ready:
+                    node.type = self.binary_type(node)
+                else:
+                    todo.append((node, True))
+                    todo.append((node.right, False))
+                    todo.append((node.left, False))
+            elif node.__class__ is nodes.UnaryOp:
+                if ready:
+                    node.type = REAL if node.op.type == TokenType.REAL else node.expr.type
+                else:
+                    todo.append((node, True))
+                    todo.append((node.expr, False))
+            else:
+                self.visit(node)
+
+    visit_UnaryOp = visit_BinOp
+
+    def binary_type(self, node):
+        """/ is REAL, DIV takes and gives INTEGERs, the others are
+        INTEGER for two INTEGERs and REAL otherwise
+        """
+        op = node.op.type
+        if op == TokenType.FLOAT_DIV:
+            return REAL
+        left, right = node.left.type, node.right.type
+        if op == TokenType.INTEGER_DIV:
+            if left != INTEGER or right != INTEGER:
+                self.error(error_code=ErrorCode.TYPE_MISMATCH, token=node.token)
+            return INTEGER
+        return INTEGER if left == right == INTEGER else REAL
 
     def visit_NoOp(self, node):
         pass
@@ -277,6 +467,14 @@ class CallStack:
     def peek(self):
         return self._records[-1]
 
+    def names(self):
+        """the names of the records, bottom of the stack first"""
+        return [ar.name for ar in self._records]
+
+    def to_list(self):
+        """the records, top of the stack first"""
+        return [ar.to_dict() for ar in reversed(self._records)]
+
     def __str__(self):
         s = '\n'.join(repr(ar) for ar in reversed(self._records))
         s = f'CALL STACK\n{s}\n'
@@ -288,23 +486,56 @@ class CallStack:
 
 class ARType(Enum):
     PROGRAM = 'PROGRAM'
+    PROCEDURE = 'PROCEDURE'
 
 
 class ActivationRecord:
-    def __init__(self, name, type, nesting_level):
+    """the variables of a scope at run time, kept in a list by the
+    slots the semantic analyzer gave them
+    """
+
+    def __init__(self, name, type, nesting_level, var_slots=None, enclosing=None):
         self.name = name
         self.type = type
         self.nesting_level = nesting_level
-        self.members = {}
+        # variable name -> slot, shared by all records of the scope
+        self.var_slots = var_slots if var_slots is not None else {}
+        self.slots = [None] * len(self.var_slots)  # variable values
+        self.enclosing = enclosing  # record of the enclosing scope
 
     def __setitem__(self, key, value):
-        self.members[key] = value
+        slot = self.var_slots.get(key)
+        if slot is None:
+            # a name without a slot, the shared table is copied first
+            self.var_slots = dict(self.var_slots)
+            self.var_slots[key] = len(self.slots)
+            self.slots.append(value)
+        else:
+            self.slots[slot] = value
 
     def __getitem__(self, key):
-        return self.members[key]
+        return self.slots[self.var_slots[key]]
 
     def get(self, key):
-        return self.members.get(key)
+        slot = self.var_slots.get(key)
+        return None if slot is None else self.slots[slot]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'type': self.type.value,
+            'nesting_level': self.nesting_level,
+            'members': self.members,
+        }
+
+    @property
+    def members(self):
+        """the assigned variables by name, in slot order"""
+        return {
+            name: self.slots[slot]
+            for name, slot in self.var_slots.items()
+            if self.slots[slot] is not None
+        }
 
     def __str__(self):
         lines = [
@@ -324,11 +555,105 @@ class ActivationRecord:
         return self.__str__()
 
 
+
+class RecordPool(object):
+    """the activation records of one procedure that returned, the next
+    calls reuse them instead of making new ones. A record is cleared
+    when it comes back, only its variable slots: an engine may keep
+    extra values in the slots list after them.
+    """
+
+    def __init__(self, name, nesting_level, var_slots, extra=0):
+        self.name = name
+        self.nesting_level = nesting_level
+        self.var_slots = var_slots
+        self.blank = (None,) * len(var_slots)
+        self.extra = (None,) * extra
+        self.free = []
+
+    def acquire(self, enclosing):
+        if self.free:
+            ar = self.free.pop()
+            ar.enclosing = enclosing
+            return ar
+        ar = ActivationRecord(
+            name=self.name,
+            type=ARType.PROCEDURE,
+            nesting_level=self.nesting_level,
+            var_slots=self.var_slots,
+            enclosing=enclosing,
+        )
+        ar.slots.extend(self.extra)
+        return ar
+
+    def release(self, ar):
+        ar.slots[:len(self.blank)] = self.blank
+        self.free.append(ar)
+
+
+class MemoCache(object):
+    """the results of calls of pure procedures, by (procedure, arguments).
+    A pure procedure has no effect outside of its activation record, so
+    the result of a call is the values of its variables when it returns.
+    Holds at most maxsize results, the least recently used one is
+    evicted for a new one.
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError(f'memo size must be at least 1, not {maxsize}')
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(decl, args):
+        # with the types: 1 and 1.0 are equal, but not in a REAL variable,
+        # and the signs of floats: 0.0 and -0.0 are equal too
+        return decl, args, tuple(
+            math.copysign(1.0, arg) if type(arg) is float else type(arg) for arg in args
+        )
+
+    def get(self, key):
+        """the result for key, None if there is none"""
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        entries = self.entries
+        entries[key] = result
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+    def __str__(self):
+        return (f'Memo: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, '
+                f'{len(self.entries)} of {self.maxsize} entries')
+
+
 class Interpreter(NodeVisitor):
 
-    def __init__(self, tree):
+    def __init__(self, tree, memo=None):
         self.tree = tree
         self.call_stack = CallStack()
+        self.pools = {}  # ProcedureDecl -> RecordPool
+        self.memo = memo  # a MemoCache for the calls of pure procedures, None runs them all
 
     def interpret(self):
         tree = self.tree
@@ -338,19 +663,25 @@ class Interpreter(NodeVisitor):
 
     def visit_Program(self, node):
         program_name = node.name
-        print(f'ENTER: PROGRAM {program_name}')
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'enter', f'ENTER: PROGRAM {program_name}',
+                        type='PROGRAM', name=program_name)
 
         ar = ActivationRecord(
             name=program_name,
             type=ARType.PROGRAM,
             nesting_level=1,
+            var_slots=node.var_slots,
         )
         self.call_stack.push(ar)
 
         self.visit(node.block)
 
-        print(f'LEAVE: PROGRAM {program_name}')
-        print(str(self.call_stack))
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'leave', f'LEAVE: PROGRAM {program_name}',
+                        type='PROGRAM', name=program_name)
+        if tracer.callstack:
+            tracer.emit(CALL_STACK, 'dump', str(self.call_stack), records=self.call_stack.to_list())
 
         self.call_stack.pop()
 
@@ -367,23 +698,88 @@ class Interpreter(NodeVisitor):
         pass
 
     def visit_ProcedureCall(self, node):
-        pass
+        proc_symbol = node.proc_symbol
+        decl = proc_symbol.decl
+        pool = self.pools.get(decl)
+        if pool is None:
+            pool = self.pools[decl] = RecordPool(
+                decl.proc_name, proc_symbol.scope_level + 1, decl.var_slots)
+
+        # the access link: the record of the scope the procedure is declared in
+        caller = self.call_stack.peek()
+        enclosing = caller
+        depth = node.depth
+        while depth:
+            enclosing = enclosing.enclosing
+            depth -= 1
+
+        # the parameters are the first slots, the arguments are
+        # evaluated in the caller and bound by position
+        ar = pool.acquire(enclosing)
+        slots = ar.slots
+        try:
+            for slot, param in enumerate(node.actual_params):
+                slots[slot] = self.visit(param)
+        except ArithmeticError as e:
+            pool.release(ar)
+            raise ExecutionError.from_exception(e, node.token) from e
+
+        key = result = None
+        if self.memo is not None and decl.pure:
+            key = self.memo.key(decl, tuple(slots[:len(node.actual_params)]))
+            result = self.memo.get(key)
+
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'enter', f'ENTER: PROCEDURE {decl.proc_name}',
+                        type='PROCEDURE', name=decl.proc_name)
+        self.call_stack.push(ar)
+        # the record is popped and released when the body raises too
+        try:
+            if result is not None:
+                # the body would compute the same values again
+                slots[:] = result
+            else:
+                try:
+                    self.visit(decl.block_node)
+                except RecursionError as e:
+                    raise ExecutionError.from_exception(e, node.token) from e
+                if key is not None:
+                    self.memo.put(key, tuple(slots))
+
+            if tracer.execution:
+                tracer.emit(EXECUTION, 'leave', f'LEAVE: PROCEDURE {decl.proc_name}',
+                            type='PROCEDURE', name=decl.proc_name)
+            if tracer.callstack:
+                tracer.emit(CALL_STACK, 'dump', str(self.call_stack), records=self.call_stack.to_list())
+        finally:
+            self.call_stack.pop()
+            pool.release(ar)
 
     def visit_Compound(self, node):
         for child in node.children:
             self.visit(child)
 
     def visit_Assign(self, node):
-        var_name = node.left.value
-        # save the var value,so use it sometimes
+        try:
+            value = self.visit(node.right)
+        except ArithmeticError as e:
+            raise ExecutionError.from_exception(e, node.left.token) from e
+        # save the var value at its lexical address
+        var = node.left
         ar = self.call_stack.peek()
-        ar[var_name] = self.visit(node.right)
+        depth = var.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        ar.slots[var.slot] = value
 
     def visit_Var(self, node):
-        var_name = node.value
         ar = self.call_stack.peek()
-        val = ar.get(var_name)
-        return val
+        depth = node.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        return ar.slots[node.slot]
 
     def visit_Type(self, node):
         # Do nothing
@@ -394,24 +790,47 @@ class Interpreter(NodeVisitor):
 
     def visit_BinOp(self, node):
         """calc the value
+
+        the whole expression is evaluated here, in post order with an
+        explicit stack, so it can be nested deeper than the recursion
+        limit and no visit is made per operator or operand. an operator
+        waiting for its operands is on the stack as its token (binary)
+        or its function (unary).
         """
-        if node.op.type == TokenType.PLUS:
-            return self.visit(node.left) + self.visit(node.right)
-        elif node.op.type == TokenType.MINUS:
-            return self.visit(node.left) - self.visit(node.right)
-        elif node.op.type == TokenType.MUL:
-            return self.visit(node.left) * self.visit(node.right)
-        elif node.op.type == TokenType.INTEGER_DIV:
-            return self.visit(node.left) // self.visit(node.right)
-        elif node.op.type == TokenType.FLOAT_DIV:
-            return float(self.visit(node.left)) / float(self.visit(node.right))
-
-    def visit_UnaryOp(self, node):
-        op = node.op.type
-        if op == TokenType.PLUS:
-            return +self.visit(node.expr)
-        elif op == TokenType.MINUS:
-            return -self.visit(node.expr)
+        ar = self.call_stack.peek()
+        values = []
+        push = values.append
+        todo = [node]
+        pending = todo.append
+        while todo:
+            node = todo.pop()
+            cls = node.__class__
+            if cls is nodes.Var:
+                outer = ar
+                depth = node.depth
+                while depth:
+                    outer = outer.enclosing
+                    depth -= 1
+                push(outer.slots[node.slot])
+            elif cls is nodes.Num:
+                push(node.value)
+            elif cls is nodes.BinOp:
+                pending(node.op)
+                pending(node.right)
+                pending(node.left)
+            elif cls is Token:
+                right = values.pop()
+                values[-1] = BINARY_OPERATORS[node.type](values[-1], right)
+            elif cls is nodes.UnaryOp:
+                pending(UNARY_OPERATORS[node.op.type])
+                pending(node.expr)
+            elif isinstance(node, nodes.AST):
+                push(self.visit(node))
+            else:
+                values[-1] = node(values[-1])
+        return values[0]
+
+    visit_UnaryOp = visit_BinOp
 
     def visit_Num(self, node):
         return node.value
@@ -1,8 +1,12 @@
 """
 Lexer
 """
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
 from error import LexerError
-from token import Token, RESERVED_KEYWORDS, TokenType
+from tokens import LineIndex, Names, Token, TokenStream, TokenType
 
 
 # lexer
@@ -12,31 +16,26 @@ class Lexer(object):
         self.pos = 0  # position
         self.current_char = self.text[self.pos]  # the current character
 
-        self.lineno = 1  # line number
-        self.column = 1  # column number
+        self.lines = LineIndex(text)  # line number and column of an offset
+        self.names = Names()  # the identifiers and keywords
 
     def error(self):
+        lineno, column = self.lines.position(self.pos)
         s = "Lexer error on '{lexeme}' line: {lineno} column: {column}".format(
             lexeme=self.current_char,
-            lineno=self.lineno,
-            column=self.column,
+            lineno=lineno,
+            column=column,
         )
         raise LexerError(message=s)
 
     def advance(self):
-        """advance the pos pointer
-        set current character, and current line number, column number
+        """advance the pos pointer and set current character
         """
-        if self.current_char == '\n':
-            self.lineno += 1
-            self.column = 0
-
         self.pos += 1
         if self.pos > len(self.text) - 1:
             self.current_char = None
         else:
             self.current_char = self.text[self.pos]
-            self.column += 1
 
     def peek(self):
         """get the next current character
@@ -57,7 +56,13 @@ class Lexer(object):
     def skip_comment(self):
         """skip the comment
         """
+        start = self.pos - 1
         while self.current_char != '}':
+            if self.current_char is None:
+                # never closed, report the '{' like the regex lexers
+                self.pos = start
+                self.current_char = self.text[start]
+                self.error()
             self.advance()
         self.advance()
 
@@ -66,7 +71,7 @@ class Lexer(object):
         for example: '12345' or '32.1213'
 
         """
-        token = Token(type=None, value=None, lineno=self.lineno, column=self.column)
+        token = Token(type=None, value=None, offset=self.pos, lines=self.lines)
 
         result = ''
         # while character is digit
@@ -97,21 +102,17 @@ class Lexer(object):
         for example: keywords like 'PROGRAM or VAR or BEGIN ...'
         or 'a, b, i, j ...'
         """
-        token = Token(type=None, value=None, lineno=self.lineno, column=self.column)
+        token = Token(type=None, value=None, offset=self.pos, lines=self.lines)
         result = ''
         # while char is digit or letter
         while self.current_char is not None and self.current_char.isalnum():
             result += self.current_char
             self.advance()
-        # if reversed keywords is None, get the current result
-        token_type = RESERVED_KEYWORDS.get(result.upper())
-        if token_type is None:
-            token.type = TokenType.ID
-            token.value = result
-        else:
-            # reserved keyword
-            token.type = token_type
-            token.value = result.upper()
+        # the names know if it is a reserved keyword
+        names = self.names
+        name = names.intern(result)
+        token.type = names.types[name]
+        token.value = names.names[name]
 
         return token
 
@@ -147,8 +148,8 @@ class Lexer(object):
                 token = Token(
                     type=TokenType.ASSIGN,
                     value=TokenType.ASSIGN.value,  # ':='
-                    lineno=self.lineno,
-                    column=self.column,
+                    offset=self.pos,
+                    lines=self.lines,
                 )
                 self.advance()
                 self.advance()
@@ -157,54 +158,380 @@ class Lexer(object):
             # get colon token
             # like: a : int
             if self.current_char == ':' and self.peek() != '=':
+                token = Token(TokenType.COLON, ':', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.COLON, ':', self.lineno, self.column)
+                return token
             # ;
             if self.current_char == ';':
+                token = Token(TokenType.SEMI, ';', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.SEMI, ';', self.lineno, self.column)
+                return token
 
             # .
             if self.current_char == '.':
+                token = Token(TokenType.DOT, '.', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.DOT, '.', self.lineno, self.column)
+                return token
 
             # ,
             if self.current_char == ',':
+                token = Token(TokenType.COMMA, ',', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.COMMA, ',', self.lineno, self.column)
+                return token
 
             if self.current_char == '+':
+                token = Token(TokenType.PLUS, '+', self.pos, self.lines)
                 self.advance()
-                token = Token(TokenType.PLUS, '+', self.lineno, self.column)
                 return token
 
             if self.current_char == '-':
+                token = Token(TokenType.MINUS, '-', self.pos, self.lines)
                 self.advance()
-                token = Token(TokenType.MINUS, '-', self.lineno, self.column)
                 return token
 
             if self.current_char == '*':
+                token = Token(TokenType.MUL, '*', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.MUL, '*', self.lineno, self.column)
+                return token
 
             if self.current_char == '/' and self.peek() == '/':
+                token = Token(TokenType.INTEGER_DIV, '//', self.pos, self.lines)
                 self.advance()
                 self.advance()
-                return Token(TokenType.INTEGER_DIV, '//', self.lineno, self.column)
+                return token
 
             if self.current_char == '/':
+                token = Token(TokenType.FLOAT_DIV, '/', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.FLOAT_DIV, '/', self.lineno, self.column)
+                return token
 
             if self.current_char == '(':
+                token = Token(TokenType.LPAREN, '(', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.LPAREN, '(', self.lineno, self.column)
+                return token
 
             if self.current_char == ')':
+                token = Token(TokenType.RPAREN, ')', self.pos, self.lines)
                 self.advance()
-                return Token(TokenType.RPAREN, ')', self.lineno, self.column)
+                return token
 
             self.error()
         # end of file
         return Token(TokenType.EOF, None)
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    regex lexer     -------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+# whitespace and comments between two lexemes
+_SKIP_PATTERN = re.compile(r'\s*(?:\{[^}]*\}\s*)*')
+
+# the master pattern, one match skips the whitespace and comments
+# before a lexeme and then matches the whole lexeme
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:\{[^}]*\}\s*)*
+    (?:
+        (?P<REAL_CONST>\d+\.\d*)
+      | (?P<INTEGER_CONST>\d+)
+      | (?P<ID>[^\W\d_][^\W_]*)
+      | (?P<OP>:=|//|[-+*/();.,:])
+    )
+""", re.VERBOSE)
+
+# operator lexeme -> token type
+_OPERATORS = {
+    token_type.value: token_type
+    for token_type in TokenType
+    if len(token_type.value) == 1
+}
+_OPERATORS[TokenType.ASSIGN.value] = TokenType.ASSIGN
+_OPERATORS['//'] = TokenType.INTEGER_DIV
+
+
+def _error(lexeme, lines, offset):
+    lineno, column = lines.position(offset)
+    s = "Lexer error on '{lexeme}' line: {lineno} column: {column}".format(
+        lexeme=lexeme,
+        lineno=lineno,
+        column=column,
+    )
+    raise LexerError(message=s)
+
+
+def _make_token(kind, lexeme, offset, lines, names):
+    """the token of a lexeme matched by the master pattern"""
+    if kind == 'ID':
+        # an identifier or a reserved keyword
+        name = names.intern(lexeme)
+        return Token(names.types[name], names.names[name], offset, lines)
+    if kind == 'OP':
+        return Token(_OPERATORS[lexeme], lexeme, offset, lines)
+    if kind == 'INTEGER_CONST':
+        return Token(TokenType.INTEGER_CONST, int(lexeme), offset, lines)
+    return Token(TokenType.REAL_CONST, float(lexeme), offset, lines)
+
+
+def _tokenize(text, pos, stream, shift=0):
+    """lex text from pos into the columns of stream, the offsets are
+    moved by shift. Return where it stops: the end of the text or a
+    character that no lexeme starts with.
+    """
+    append = stream.append
+    match_token = _TOKEN_PATTERN.match
+    names = stream.names
+    ids = names.ids
+    types = names.types
+
+    match = match_token(text, pos)
+    while match is not None:
+        kind = match.lastgroup
+        start = match.start(kind)
+        pos = match.end()
+        if kind == 'ID':
+            lexeme = match.group(kind)
+            name = ids.get(lexeme)
+            if name is None:
+                name = names.add(lexeme)
+            append(types[name], shift + start, pos - start, None, name)
+        elif kind == 'OP':
+            append(_OPERATORS[match.group(kind)], shift + start, pos - start)
+        elif kind == 'INTEGER_CONST':
+            append(TokenType.INTEGER_CONST, shift + start, pos - start, int(match.group(kind)))
+        else:
+            append(TokenType.REAL_CONST, shift + start, pos - start, float(match.group(kind)))
+        match = match_token(text, pos)
+
+    return _SKIP_PATTERN.match(text, pos).end()
+
+
+class RegexLexer(object):
+    """single-pass lexer, it matches whole lexemes with one compiled
+    pattern instead of advancing char by char.
+
+    It emits the same tokens (with positions) as Lexer, so the parser
+    can use either of them.
+    """
+
+    def __init__(self, text):
+        self.text = text  # the program character
+        self.pos = 0  # position after the last token
+        # the character right after the last token
+        self.current_char = self.text[0] if self.text else None
+
+        self.lines = LineIndex(text)  # line number and column of an offset
+        self.names = Names()  # the identifiers and keywords
+
+    def error(self, pos):
+        _error(self.text[pos], self.lines, pos)
+
+    def get_next_token(self):
+        """match the next lexeme and return its token
+        """
+        text = self.text
+        match = _TOKEN_PATTERN.match(text, self.pos)
+        if match is None:
+            pos = _SKIP_PATTERN.match(text, self.pos).end()
+            if pos < len(text):
+                self.error(pos)
+            # end of file
+            self.pos = pos
+            self.current_char = None
+            return Token(TokenType.EOF, None)
+
+        kind = match.lastgroup
+        start = match.start(kind)
+        end = match.end()
+        self.pos = end
+        self.current_char = text[end] if end < len(text) else None
+
+        return _make_token(kind, match.group(kind), start, self.lines, self.names)
+
+    def tokenize(self):
+        """lex the rest of the text into a TokenStream, without creating
+        a Token per lexeme
+        """
+        stream = TokenStream(self.text, self.lines, self.names)
+        pos = _tokenize(self.text, self.pos, stream)
+        if pos < len(self.text):
+            self.error(pos)
+        # end of file
+        stream.append(TokenType.EOF, pos, 0)
+        self.pos = pos
+        self.current_char = None
+        return stream
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    stream lexer     ------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+class StreamLexer(object):
+    """regex lexer over a Source that is read chunk by chunk.
+
+    Only a window of the source is kept in memory: the lexemes are
+    matched in a buffer that holds the rest of the last chunk and the
+    next one. A lexeme (or a ':=' , '//' or comment) that touches the
+    end of the buffer is matched again after the next chunk is read.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.buffer = ''  # the window of the source
+        self.base = 0  # offset of the buffer in the source
+        self.pos = 0  # position in the buffer after the last token
+        self.eof = False  # the source has no more chunks
+        self.current_char = None  # the character right after the last token
+
+        # line number and column of an offset, extended chunk by chunk
+        self.lines = LineIndex()
+        self.names = Names()  # the identifiers and keywords
+
+    def error(self, offset, lexeme):
+        _error(lexeme, self.lines, offset)
+
+    def fill(self):
+        """drop the consumed part of the buffer and append the next chunk
+        """
+        chunk = self.source.read()
+        if not chunk:
+            self.eof = True
+        self.lines.extend(chunk, self.base + len(self.buffer))
+        self.base += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def skip_comment(self):
+        """skip a comment that is not closed in the buffer, the chunks
+        of the comment are dropped as soon as they are read
+        """
+        offset = self.base + self.pos
+        while True:
+            end = self.buffer.find('}', self.pos)
+            if end != -1:
+                self.pos = end + 1
+                return
+            if self.eof:
+                self.error(offset, '{')
+            self.pos = len(self.buffer)
+            self.fill()
+
+    def get_next_token(self):
+        """match the next lexeme and return its token
+        """
+        while True:
+            buffer = self.buffer
+            match = _TOKEN_PATTERN.match(buffer, self.pos)
+            if match is not None:
+                if match.end() < len(buffer) or self.eof:
+                    break
+                # the lexeme may go on in the next chunk
+                self.fill()
+                continue
+
+            # whitespace and comments only, up to the end of the buffer
+            # or to a comment that is not closed yet
+            self.pos = _SKIP_PATTERN.match(buffer, self.pos).end()
+            if self.pos < len(buffer):
+                if buffer[self.pos] != '{':
+                    self.error(self.base + self.pos, buffer[self.pos])
+                self.skip_comment()
+            elif self.eof:
+                # end of file
+                self.current_char = None
+                return Token(TokenType.EOF, None)
+            else:
+                self.fill()
+
+        kind = match.lastgroup
+        start = match.start(kind)
+        end = match.end()
+        self.pos = end
+        self.current_char = buffer[end] if end < len(buffer) else None
+        return _make_token(kind, match.group(kind), self.base + start, self.lines, self.names)
+
+    def iter_tokens(self):
+        """generate the tokens while the source is being read,
+        the last one is EOF
+        """
+        while True:
+            token = self.get_next_token()
+            yield token
+            if token.type == TokenType.EOF:
+                return
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    parallel lexer     ----------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+# below this size the process pool costs more than it saves
+PARALLEL_MIN_SIZE = 256 * 1024
+
+
+def split_source(text, parts):
+    """split the text into about `parts` chunks and return the bounds
+    [0, b1, b2, ..., len(text)].
+
+    Every bound is a whitespace character outside of a comment, so no
+    comment, number, identifier or operator is cut. There are no string
+    literals and comments do not nest, so a position is inside a
+    comment when the last '{' before it comes after the last '}'.
+    """
+    bounds = [0]
+    for i in range(1, parts):
+        pos = max(len(text) * i // parts, bounds[-1])
+        while pos < len(text):
+            if text.rfind('{', 0, pos) > text.rfind('}', 0, pos):
+                # inside a comment, go on after it
+                pos = text.find('}', pos)
+                pos = len(text) if pos == -1 else pos + 1
+                continue
+            if text[pos].isspace():
+                break
+            pos += 1
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    if bounds[-1] < len(text):
+        bounds.append(len(text))
+    return bounds
+
+
+def _lex_chunk(chunk, shift):
+    """process pool worker: lex one chunk, offsets are moved by shift
+    so they are offsets in the whole source.
+    """
+    stream = TokenStream(chunk, LineIndex())
+    pos = _tokenize(chunk, 0, stream, shift)
+    return (stream.kinds, stream.offsets, stream.lengths, stream.ids,
+            stream.names.spellings(), stream.literals, pos)
+
+
+def lex_parallel(text, workers=None, chunks_per_worker=4):
+    """lex text into a TokenStream, chunks of the text are lexed in a
+    ProcessPoolExecutor and the results stitched together in order.
+
+    The offsets are corrected by the workers, line numbers and columns
+    are resolved from the line index of the whole text.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(text) < PARALLEL_MIN_SIZE:
+        return RegexLexer(text).tokenize()
+
+    bounds = split_source(text, workers * chunks_per_worker)
+    stream = TokenStream(text)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _lex_chunk,
+            [text[start:end] for start, end in zip(bounds, bounds[1:])],
+            bounds[:-1],
+        )
+        for start, end, (kinds, offsets, lengths, ids, spellings, literals, pos) in zip(
+                bounds, bounds[1:], results):
+            if start + pos < end:
+                _error(text[start + pos], stream.lines, start + pos)
+            stream.extend(kinds, offsets, lengths, ids, spellings, literals)
+    # end of file
+    stream.append(TokenType.EOF, len(text), 0)
+    return stream
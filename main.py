@@ -1,46 +1,460 @@
 """the main"""
 import argparse
+import io
+import json
+import os
 import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from functools import partial
 
-from error import LexerError, ParserError, SemanticError
-from interpreter import SemanticAnalyzer, Interpreter
-from lexer import Lexer
-from parser import Parser
+from arena import NodeArena
+from bytecode import Compiler, VM, disassemble
+from cache import ProgramCache
+from closure import ClosureInterpreter
+from error import ExecutionError, LexerError, ParserError, SemanticError
+from interpreter import SemanticAnalyzer, Interpreter, MemoCache
+from lexer import Lexer, RegexLexer, StreamLexer, lex_parallel
+from optimizer import Optimizer
+from parser import Parser, StreamParser
+from profiling import ProfilingInterpreter, SamplingProfiler
+from server import CACHE_SIZE, serve
+from source import FileSource, MmapSource
+from tracing import CATEGORIES, LOOKUP, SCOPE, JsonLinesSink, TextSink, tracer
+from transpiler import PythonInterpreter
+
+MEMO_SIZE = 1024  # default --memo-size
 
 
 def main():
     parser = argparse.ArgumentParser(
         description='SPI - Simple Pascal Interpreter'
     )
-    parser.add_argument('inputfile', help='Pascal source file')
+    parser.add_argument(
+        'inputfile',
+        help='Pascal source file, several run them in batch mode',
+        nargs='*',
+    )
     parser.add_argument(
         '--scope',
-        help='Print scope information',
+        help='Print scope information (same as --trace scope,lookup)',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--trace',
+        help='Comma separated trace categories to enable, or "all": '
+             + ', '.join(CATEGORIES),
+        default='',
+    )
+    parser.add_argument(
+        '--trace-file',
+        help='Write the trace events as JSON lines to this file instead of stdout',
+    )
+    parser.add_argument(
+        '--lexer',
+        help='Lexer engine: char-by-char scanning, a single-pass regex, '
+             'a regex lexing into a columnar token stream, '
+             'a regex over the file read chunk by chunk, '
+             'or regex lexers over chunks of the file in a process pool',
+        choices=('char', 'regex', 'columnar', 'stream', 'parallel'),
+        default='char',
+    )
+    parser.add_argument(
+        '--mmap',
+        help='Read the source through mmap (with --lexer stream)',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--jobs',
+        help='Number of processes (with --lexer parallel), default: CPU count',
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        '--engine',
+        help='Execution engine: AST tree walker, the AST compiled into closures, '
+             'the AST compiled into bytecode for a stack VM, '
+             'or the program transpiled to Python',
+        choices=('tree', 'closure', 'bytecode', 'python'),
+        default='tree',
+    )
+    parser.add_argument(
+        '--emit-python',
+        help='Print the generated Python source (with --engine python)',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--dis',
+        help='Print the disassembled bytecode (with --engine bytecode)',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--optimize',
+        help='Fold constants and simplify expressions before running',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--cache',
+        help='Reuse the checked program (and bytecode) cached in a '
+             '__nancache__ directory next to the input file',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Cache directory to use instead (implies --cache)',
+    )
+    parser.add_argument(
+        '--arena',
+        help='Run from the checked program stored in array columns instead of '
+             'node objects: a fraction of the memory, slower to walk',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--memo',
+        help='Memoize the calls of pure procedures, by their arguments, '
+             'and print the hits, misses and evictions',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--memo-size',
+        help=f'Maximum number of memoized calls, least recently used evicted first '
+             f'(implies --memo), default: {MEMO_SIZE}',
+        type=int,
+    )
+    parser.add_argument(
+        '--profile',
+        help='Time the nodes the tree walker visits and print a profile '
+             'by node type, by operator and of the hottest nodes',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--profile-json',
+        help='Write the profile as JSON to this file instead (implies --profile)',
+    )
+    parser.add_argument(
+        '--profile-top',
+        help='Number of hottest nodes in the profile, default: 10',
+        type=int,
+        default=10,
+    )
+    parser.add_argument(
+        '--sample',
+        help='Sample the running tree walker and write the call stacks and '
+             'source lines to this file as folded stacks, for flame graphs',
+    )
+    parser.add_argument(
+        '--sample-interval',
+        help='CPU time between samples in milliseconds (with --sample), default: 1',
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        '--manifest',
+        help='File listing the programs to run in batch mode, one path per '
+             'line relative to the manifest, # starts a comment',
+    )
+    parser.add_argument(
+        '--batch',
+        help='Run in batch mode even for a single program',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--workers',
+        help='Number of processes in batch and server mode, default: CPU count',
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        '--batch-report',
+        help='Write the batch results, with the output of every program, '
+             'as JSON to this file',
+    )
+    parser.add_argument(
+        '--serve',
+        help='Run as a server: read JSON requests, one per line, run the '
+             'programs in a process pool and write JSON responses',
         action='store_true',
     )
+    parser.add_argument(
+        '--socket',
+        help='Serve the connections to this Unix socket instead of stdin/stdout '
+             '(implies --serve)',
+    )
+    parser.add_argument(
+        '--serve-cache-size',
+        help=f'Number of compiled programs each server worker keeps, least '
+             f'recently used evicted first, default: {CACHE_SIZE}',
+        type=int,
+        default=CACHE_SIZE,
+    )
     args = parser.parse_args()
-    global _SHOULD_LOG_SCOPE
-    _SHOULD_LOG_SCOPE = args.scope
+    if (args.profile or args.profile_json) and args.engine != 'tree':
+        parser.error('--profile needs --engine tree')
+    if args.sample and args.engine != 'tree':
+        parser.error('--sample needs --engine tree')
+    if args.memo_size is not None and args.memo_size < 1:
+        parser.error('--memo-size must be at least 1')
+    if (args.memo or args.memo_size) and args.engine != 'tree':
+        parser.error('--memo needs --engine tree')
+
+    if args.serve or args.socket:
+        if args.inputfile or args.manifest:
+            parser.error('--serve reads the programs from the requests, not from files')
+        if args.serve_cache_size < 1:
+            parser.error('--serve-cache-size must be at least 1')
+        serve(args.workers, args.serve_cache_size, args.socket)
+        return
+
+    try:
+        categories = trace_categories(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.trace_file and not categories:
+        parser.error('--trace-file needs --trace or --scope')
+
+    paths = list(args.inputfile)
+    if args.manifest:
+        paths.extend(read_manifest(args.manifest))
+    if not paths:
+        parser.error('no input file')
+    if args.batch or args.manifest or len(paths) > 1:
+        if args.trace_file or args.profile_json or args.sample:
+            parser.error('--trace-file, --profile-json and --sample write one file, '
+                         'they cannot be used in batch mode')
+        sys.exit(run_batch(args, paths))
+
+    args.inputfile = paths[0]
+    start_tracing(args, categories)
+    try:
+        run(args)
+    finally:
+        tracer.close()
+
 
-    text = open(args.inputfile, 'r').read()
+def trace_categories(args):
+    categories = [category for category in args.trace.split(',') if category]
+    if 'all' in categories:
+        categories = list(CATEGORIES)
+    if args.scope:
+        categories.extend((SCOPE, LOOKUP))
+    unknown = set(categories) - set(CATEGORIES)
+    if unknown:
+        raise ValueError(f'unknown trace categories: {", ".join(sorted(unknown))}')
+    return categories
 
-    lexer = Lexer(text)
+
+def start_tracing(args, categories):
+    if categories:
+        sink = JsonLinesSink(args.trace_file) if args.trace_file else TextSink()
+        tracer.enable(categories, sink)
+
+
+def report(message):
+    """print a message after the trace events written before it"""
+    tracer.flush()
+    print(message)
+
+
+def run(args):
+    cache = None
+    text = None
+    if args.cache or args.cache_dir:
+        cache = ProgramCache(args.cache_dir)
+        # the key is the hash of the whole source
+        text = open(args.inputfile, 'r').read()
+
+    # bytecode compiled from the optimized tree is cached separately
+    code_kind = 'bytecode-opt' if args.optimize else 'bytecode'
+    code = None
+    if cache is not None and args.engine == 'bytecode':
+        code = cache.load_code(args.inputfile, text, code_kind)
+
+    if code is None:
+        tree = None
+        if cache is not None:
+            tree = cache.load_tree(args.inputfile, text)
+        if tree is None:
+            tree = check(args, text)
+            if cache is not None:
+                cache.store_tree(args.inputfile, text, tree)
+
+        if args.optimize:
+            optimizer = Optimizer()
+            tree = optimizer.optimize(tree)
+            report(f'Optimizer: {optimizer.removed} nodes removed')
+
+        if args.arena:
+            tree = NodeArena.from_tree(tree).root
+
+    if args.engine == 'closure':
+        interpreter = ClosureInterpreter(tree)
+    elif args.engine == 'bytecode':
+        if code is None:
+            code = Compiler().compile(tree)
+            if cache is not None:
+                cache.store_code(args.inputfile, text, code, code_kind)
+        if args.dis:
+            report(disassemble(code))
+        interpreter = VM(code)
+    elif args.engine == 'python':
+        try:
+            interpreter = PythonInterpreter(tree)
+        except ExecutionError as e:
+            # the generated python can not be compiled
+            report(e.message)
+            sys.exit(1)
+        if args.emit_python:
+            report(interpreter.source)
+    else:
+        memo = None
+        if args.memo or args.memo_size:
+            memo = MemoCache(args.memo_size or MEMO_SIZE)
+        if args.profile or args.profile_json:
+            interpreter = ProfilingInterpreter(tree, memo=memo)
+        else:
+            interpreter = Interpreter(tree, memo)
+    sampler = None
+    if args.sample:
+        sampler = SamplingProfiler(interpreter, args.sample_interval / 1000)
+        sampler.start()
+    try:
+        interpreter.interpret()
+    except ExecutionError as e:
+        report(e.message)
+        sys.exit(1)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+            sampler.write_folded(args.sample)
+        if args.profile_json:
+            interpreter.write_json(args.profile_json, args.profile_top)
+        elif args.profile:
+            report(interpreter.format_table(args.profile_top))
+        if getattr(interpreter, 'memo', None) is not None:
+            report(str(interpreter.memo))
+
+
+def check(args, text=None):
+    """lex, parse and analyze the input file, exit on errors"""
+    if args.lexer == 'stream':
+        if args.mmap:
+            source = MmapSource(args.inputfile)
+        else:
+            source = FileSource(args.inputfile)
+        lexer = StreamLexer(source)
+    else:
+        source = None
+        if text is None:
+            text = open(args.inputfile, 'r').read()
+        if args.lexer == 'char':
+            lexer = Lexer(text)
+        elif args.lexer != 'parallel':
+            lexer = RegexLexer(text)
     try:
-        parser = Parser(lexer)
+        if args.lexer == 'columnar':
+            parser = StreamParser(lexer.tokenize())
+        elif args.lexer == 'parallel':
+            parser = StreamParser(lex_parallel(text, args.jobs))
+        else:
+            parser = Parser(lexer)
         tree = parser.parse()
     except (LexerError, ParserError) as e:
-        print(e.message)
+        report(e.message)
         sys.exit(1)
+    finally:
+        if source is not None:
+            source.close()
 
     semantic_analyzer = SemanticAnalyzer()
     try:
         semantic_analyzer.visit(tree)
     except SemanticError as e:
-        print(e.message)
+        report(e.message)
         sys.exit(1)
+    return tree
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    batch mode     --------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+def read_manifest(manifest):
+    directory = os.path.dirname(manifest)
+    paths = []
+    with open(manifest) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                paths.append(os.path.join(directory, line))
+    return paths
+
+
+def run_program(args, path):
+    """run one program in a batch worker, with its output captured
+
+    returns {'path', 'status', 'seconds', 'stdout', 'stderr'}
+    """
+    args = argparse.Namespace(**vars(args))
+    args.inputfile = path
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = 0
+    start = time.perf_counter()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            start_tracing(args, trace_categories(args))
+            run(args)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            tracer.disable()
+    return {
+        'path': path,
+        'status': status,
+        'seconds': time.perf_counter() - start,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+    }
+
+
+def run_batch(args, paths):
+    """run the programs in a process pool, print their output in order
+    and a summary, return the exit status: 1 if any program failed
+    """
+    start = time.perf_counter()
+    workers = args.workers or os.cpu_count() or 1
+    # enough chunks to keep the workers busy, few enough to pass cheaply
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(partial(run_program, args), paths, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        print(f'==> {result["path"]} (exit {result["status"]}, {result["seconds"] * 1000:.1f} ms)')
+        sys.stdout.write(result['stdout'])
+        sys.stdout.write(result['stderr'])
+    failed = sum(1 for result in results if result['status'])
+    busy = sum(result['seconds'] for result in results)
+    print(f'Batch: {len(results)} programs, {failed} failed, {elapsed:.3f}s '
+          f'({busy:.3f}s in the programs, {workers} workers)')
 
-    interpreter = Interpreter(tree)
-    interpreter.interpret()
+    if args.batch_report:
+        with open(args.batch_report, 'w') as f:
+            json.dump({
+                'programs': len(results),
+                'failed': failed,
+                'workers': workers,
+                'seconds': elapsed,
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+    return 1 if failed else 0
 
 
 if __name__ == '__main__':
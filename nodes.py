@@ -32,23 +32,33 @@ factor : PLUS factor
 variable: ID
 
 """
+from collections import deque
 
 
 class AST(object):
-    pass
+    # no __dict__: a node is its slots, programs can have millions of them
+    __slots__ = ()
+    _fields = ()  # attributes that hold child nodes (or lists of them)
 
 
 # PROGRAM: root node
 # program : PROGRAM variable SEMI block DOT
 class Program(AST):
+    __slots__ = ('name', 'block', 'var_slots')
+    _fields = ('block',)
+
     def __init__(self, name, block):
         self.name = name  # program name
         self.block = block  # contain's block(declaration and compound)
+        self.var_slots = {}  # variable name -> slot, set by the semantic analyzer
 
 
 # block
 # block : declarations compound_statement
 class Block(AST):
+    __slots__ = ('declarations', 'compound_statement')
+    _fields = ('declarations', 'compound_statement')
+
     def __init__(self, declarations, compound_statement):
         self.declarations = declarations  # contain's declarations
         self.compound_statement = compound_statement  # contain's compound
@@ -64,6 +74,9 @@ empty
 # var declarations
 # a : int
 class VarDecl(AST):
+    __slots__ = ('var_node', 'type_node')
+    _fields = ('var_node', 'type_node')
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node  # var
         self.type_node = type_node  # type<int or float or string>
@@ -71,22 +84,40 @@ class VarDecl(AST):
 
 # procedure declarations
 class ProcedureDecl(AST):
-    def __init__(self, proc_name, params, block_node):
+    __slots__ = ('proc_name', 'params', 'block_node', 'token', 'var_slots', 'pure')
+    _fields = ('params', 'block_node')
+
+    def __init__(self, proc_name, params, block_node, token):
         self.proc_name = proc_name
         self.params = params  # a list of Param nodes
         self.block_node = block_node  # block
+        self.token = token  # the ID token of its name
+        self.var_slots = {}  # variable name -> slot, set by the semantic analyzer
+        # set by the semantic analyzer: the procedure only reads and writes
+        # its own variables and calls pure procedures
+        self.pure = False
 
 
 class ProcedureCall(AST):
+    __slots__ = ('proc_name', 'actual_params', 'token', 'proc_symbol', 'depth')
+    _fields = ('actual_params',)
+
     def __init__(self, proc_name, actual_params, token):
         self.proc_name = proc_name
         self.actual_params = actual_params
         self.token = token
+        # set by the semantic analyzer: the procedure called, and how
+        # many scopes up from the call it's declared
+        self.proc_symbol = None
+        self.depth = None
 
 
 # procedure params
 # just like VarDecl
 class Param(AST):
+    __slots__ = ('var_node', 'type_node')
+    _fields = ('var_node', 'type_node')
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
@@ -95,6 +126,9 @@ class Param(AST):
 # compound
 # BEGIN...END
 class Compound(AST):
+    __slots__ = ('children',)
+    _fields = ('children',)
+
     def __init__(self):
         self.children = []
 
@@ -102,6 +136,9 @@ class Compound(AST):
 # assign
 # just like a := 10
 class Assign(AST):
+    __slots__ = ('left', 'token', 'op', 'right')
+    _fields = ('left', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
         self.token = self.op = op
@@ -116,6 +153,7 @@ type Var Num
 
 # type integer or float
 class Type(AST):
+    __slots__ = ('token', 'value')
     def __init__(self, token):
         self.token = token
         self.value = token.value
@@ -123,35 +161,74 @@ class Type(AST):
 
 # var
 class Var(AST):
+    __slots__ = ('token', 'value', 'depth', 'slot', 'type')
     def __init__(self, token):
         self.token = token
         self.value = token.value
+        # lexical address, set by the semantic analyzer:
+        # how many scopes up it's declared, and its slot there
+        self.depth = None
+        self.slot = None
+        self.type = None  # 'INTEGER' or 'REAL', set by the semantic analyzer
 
 
 # number
 class Num(AST):
+    __slots__ = ('token', 'value', 'type')
     def __init__(self, token):
         self.token = token
         self.value = token.value
+        self.type = None  # 'INTEGER' or 'REAL', set by the semantic analyzer
 
 
 # no operation
 class NoOp(AST):
-    pass
+    __slots__ = ()
 
 
 # binary operation
 # + - * /
 class BinOp(AST):
+    __slots__ = ('left', 'token', 'op', 'right', 'type')
+    _fields = ('left', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
         self.token = self.op = op
         self.right = right
+        self.type = None  # 'INTEGER' or 'REAL', set by the semantic analyzer
 
 
 # unary operation
 # 5--3
 class UnaryOp(AST):
+    __slots__ = ('token', 'op', 'expr', 'type')
+    _fields = ('expr',)
+
     def __init__(self, op, expr):
         self.token = self.op = op
         self.expr = expr
+        self.type = None  # 'INTEGER' or 'REAL', set by the semantic analyzer
+
+
+def iter_child_nodes(node):
+    """yield the direct child nodes of a node"""
+    for field in node._fields:
+        value = getattr(node, field)
+        if isinstance(value, list):
+            yield from value
+        elif value is not None:
+            yield value
+
+
+def walk(node):
+    """yield the node and all its descendants, in no specified order"""
+    todo = deque([node])
+    while todo:
+        node = todo.popleft()
+        todo.extend(iter_child_nodes(node))
+        yield node
+
+
+def count_nodes(node):
+    return sum(1 for _ in walk(node))
@@ -0,0 +1,196 @@
+"""
+optimizer
+
+an optional pass between the parser (and semantic analyzer) and the
+interpreter: constant subtrees are folded, unary operator chains
+collapsed and identities like x * 1 or x + 0 simplified where the
+types allow it. The folded values are computed with the operators the
+interpreter uses, so INTEGER DIV and REAL / keep their semantics.
+"""
+import nodes
+from interpreter import BINARY_OPERATORS, INTEGER, NodeVisitor, REAL, UNARY_OPERATORS
+from tokens import Token, TokenType
+
+
+def _is_const(node, value, types=(int,)):
+    """node is a Num of value, and of one of the python types"""
+    return isinstance(node, nodes.Num) and type(node.value) in types and node.value == value
+
+
+def _num(value, token):
+    """a Num node for a folded value, at the position of token"""
+    token_type = TokenType.INTEGER_CONST if isinstance(value, int) else TokenType.REAL_CONST
+    node = nodes.Num(Token(token_type, value, token.offset, token.lines))
+    node.type = INTEGER if isinstance(value, int) else REAL
+    return node
+
+
+class Optimizer(NodeVisitor):
+    """every visit returns the optimized node, the tree must have been
+    checked by the SemanticAnalyzer, which sets the expression types
+    """
+
+    def __init__(self):
+        self.removed = 0  # number of nodes removed
+
+    def optimize(self, tree):
+        before = nodes.count_nodes(tree)
+        tree = self.visit(tree)
+        self.removed = before - nodes.count_nodes(tree)
+        return tree
+
+    def type_of(self, node):
+        """static type name of an expression, None if unknown"""
+        return getattr(node, 'type', None)
+
+    def visit_Program(self, node):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_Block(self, node):
+        node.declarations = [self.visit(declaration) for declaration in node.declarations]
+        node.compound_statement = self.visit(node.compound_statement)
+        return node
+
+    def visit_VarDecl(self, node):
+        return node
+
+    def visit_ProcedureDecl(self, node):
+        node.block_node = self.visit(node.block_node)
+        return node
+
+    def visit_ProcedureCall(self, node):
+        node.actual_params = [self.visit(param) for param in node.actual_params]
+        return node
+
+    def visit_Compound(self, node):
+        node.children = [self.visit(child) for child in node.children]
+        return node
+
+    def visit_Assign(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_NoOp(self, node):
+        return node
+
+    def visit_Var(self, node):
+        return node
+
+    def visit_Num(self, node):
+        return node
+
+    def visit_BinOp(self, node):
+        """the optimized expression
+
+        the operators are walked in post order with an explicit stack,
+        an expression can be nested deeper than the recursion limit.
+        the optimized operands wait on the values stack.
+        """
+        values = []
+        todo = [(node, False)]  # (node, operands optimized)
+        while todo:
+            node, ready = todo.pop()
+            if node.__class__ is nodes.BinOp:
+                if ready:
+                    right = values.pop()
+                    values[-1] = self.binary(node, values[-1], right)
+                else:
+                    todo.append((node, True))
+                    todo.append((node.right, False))
+                    todo.append((node.left, False))
+            elif node.__class__ is nodes.UnaryOp:
+                if ready:
+                    values[-1] = self.unary(node, values[-1])
+                else:
+                    todo.append((node, True))
+                    todo.append((node.expr, False))
+            else:
+                values.append(self.visit(node))
+        return values[0]
+
+    visit_UnaryOp = visit_BinOp
+
+    def unary(self, node, expr):
+        """node with its optimized operand expr"""
+        if node.op.type == TokenType.REAL:
+            # a conversion, folded for a literal
+            if isinstance(expr, nodes.Num):
+                try:
+                    return _num(float(expr.value), node.token)
+                except OverflowError:
+                    pass
+            node.expr = expr
+            return node
+
+        if isinstance(expr, nodes.Num):
+            return _num(UNARY_OPERATORS[node.op.type](expr.value), node.token)
+
+        if self.type_of(expr) is None:
+            node.expr = expr
+            return node
+        # collapse the chain, an operand is already collapsed: --x is x,
+        # ---x is -x
+        if isinstance(expr, nodes.UnaryOp) and expr.op.type == TokenType.MINUS:
+            return expr.expr if node.op.type == TokenType.MINUS else expr
+        if node.op.type == TokenType.PLUS:
+            return expr
+        unary = nodes.UnaryOp(node.op, expr)
+        unary.type = expr.type
+        return unary
+
+    def binary(self, node, left, right):
+        """node with its optimized operands left and right"""
+        node.left = left
+        node.right = right
+        op = node.op.type
+
+        if isinstance(left, nodes.Num) and isinstance(right, nodes.Num):
+            try:
+                value = BINARY_OPERATORS[op](left.value, right.value)
+            except (ZeroDivisionError, OverflowError):
+                # left for the interpreter to report at run time, a
+                # huge int / 3 is too large for a float
+                return node
+            return _num(value, node.token)
+
+        return self.simplify(node, op, left, right) or node
+
+    def simplify(self, node, op, left, right):
+        """the simplified node of an identity, None if there is none.
+
+        With an INTEGER operand all of them are exact, with a REAL one
+        only those that keep the float exactly as it is (x + 0 is not,
+        -0.0 + 0 is 0.0). A REAL is a float at run time, the analyzer
+        widens the INTEGERs stored in one, so x * 1.0 and x / 1 give x
+        itself and not an int.
+        """
+        left_type = self.type_of(left)
+        right_type = self.type_of(right)
+        if op == TokenType.MUL:
+            # x * 1, 1 * x, and x * 1.0 for a REAL x
+            if _is_const(right, 1) and left_type is not None:
+                return left
+            if _is_const(left, 1) and right_type is not None:
+                return right
+            if _is_const(right, 1, (float,)) and left_type == REAL:
+                return left
+            if _is_const(left, 1, (float,)) and right_type == REAL:
+                return right
+        elif op == TokenType.PLUS:
+            if _is_const(right, 0) and left_type == INTEGER:
+                return left
+            if _is_const(left, 0) and right_type == INTEGER:
+                return right
+        elif op == TokenType.MINUS:
+            if _is_const(right, 0) and left_type is not None:
+                return left
+            if _is_const(right, 0, (float,)) and left_type == REAL:
+                return left
+        elif op == TokenType.INTEGER_DIV:
+            if _is_const(right, 1) and left_type == INTEGER:
+                return left
+        elif op == TokenType.FLOAT_DIV:
+            if _is_const(right, 1, (int, float)) and left_type == REAL:
+                return left
+        return None
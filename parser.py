@@ -3,10 +3,21 @@ Parser
 parser the AST node
 
 """
-import ast
+import nodes
 
 from error import ParserError, ErrorCode
-from token import TokenType
+from tokens import TokenType
+
+# binary operator -> precedence, the unary + and - bind tighter than all
+BINARY_PRECEDENCE = {
+    TokenType.PLUS: 1,
+    TokenType.MINUS: 1,
+    TokenType.MUL: 2,
+    TokenType.INTEGER_DIV: 2,
+    TokenType.FLOAT_DIV: 2,
+}
+UNARY_PRECEDENCE = 3
+PAREN = (0, None)  # below every operator, reducing stops there
 
 
 class Parser(object):
@@ -25,6 +36,11 @@ class Parser(object):
     def get_next_token(self):
         return self.lexer.get_next_token()
 
+    def token(self):
+        """the current token as a Token, AST nodes and errors keep it
+        """
+        return self.current_token
+
     def eat(self, token_type):
         """function eat the current token and get next token.
         """
@@ -33,7 +49,7 @@ class Parser(object):
         else:
             self.error(
                 error_code=ErrorCode.UNEXPECTED_TOKEN,
-                token=self.current_token
+                token=self.token()
             )
 
     def parse(self):
@@ -42,82 +58,72 @@ class Parser(object):
         if self.current_token.type != TokenType.EOF:
             self.error(
                 error_code=ErrorCode.UNEXPECTED_TOKEN,
-                token=self.current_token
+                token=self.token()
             )
 
         return node
 
-    def factor(self):
-        """factor : PLUS factor
-                  | MINUS factor
-                  | INTEGER_CONST
-                  | REAL_CONST
-                  | LPAREN expr RPAREN
-                  | variable
-
-        factor calc plus or minus
-        """
-        token = self.current_token
-        # +
-        if token.type == TokenType.PLUS:
-            self.eat(TokenType.PLUS)
-            return ast.UnaryOp(token, self.factor())
-        # -
-        elif token.type == TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            return ast.UnaryOp(token, self.factor())
-        # int
-        elif token.type == TokenType.INTEGER_CONST:
-            self.eat(TokenType.INTEGER_CONST)
-            return ast.Num(token)
-        # float
-        elif token.type == TokenType.REAL_CONST:
-            self.eat(TokenType.REAL_CONST)
-            return ast.Num(token)
-        # (
-        elif token.type == TokenType.LPAREN:
-            self.eat(TokenType.LPAREN)
-            node = self.expr()
-            self.eat(TokenType.RPAREN)
-            return node
-        else:
-            return self.variable()
-
-    def term(self):
-        """term : factor ((MUL | INTEGER_DIV | FLOAT_DIV) factor)*
-        """
-        node = self.factor()
-
-        while self.current_token.type in (
-                TokenType.MUL,
-                TokenType.INTEGER_DIV,
-                TokenType.FLOAT_DIV
-        ):
-            token = self.current_token
-            if token.type == TokenType.MUL:
-                self.eat(TokenType.MUL)
-            elif token.type == TokenType.INTEGER_DIV:
-                self.eat(TokenType.INTEGER_DIV)
-            elif token.type == TokenType.FLOAT_DIV:
-                self.eat(TokenType.FLOAT_DIV)
-
-            node = ast.BinOp(left=node, op=token, right=self.factor())
-
-        return node
-
     def expr(self):
         """expr : term ((PLUS | MINUS) term)*
+        term : factor ((MUL | INTEGER_DIV | FLOAT_DIV) factor)*
+        factor : PLUS factor
+               | MINUS factor
+               | INTEGER_CONST
+               | REAL_CONST
+               | LPAREN expr RPAREN
+               | variable
+
+        precedence climbing over an operand and an operator stack rather
+        than a call per grammar level, so the depth of the Python stack
+        does not grow with the nesting of the expression
         """
-        node = self.term()
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            token = self.current_token
-            if token.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-            elif token.type == TokenType.MINUS:
-                self.eat(TokenType.MINUS)
-
-            node = ast.BinOp(left=node, op=token, right=self.term())
-        return node
+        operands = []
+        operators = []  # (precedence, token), PAREN for an open parenthesis
+        while True:
+            # operand: unary operators and parentheses, then a number or variable
+            token = self.token()
+            if token.type in (TokenType.PLUS, TokenType.MINUS):
+                self.eat(token.type)
+                operators.append((UNARY_PRECEDENCE, token))
+                continue
+            if token.type == TokenType.LPAREN:
+                self.eat(TokenType.LPAREN)
+                operators.append(PAREN)
+                continue
+            if token.type in (TokenType.INTEGER_CONST, TokenType.REAL_CONST):
+                self.eat(token.type)
+                operands.append(nodes.Num(token))
+            else:
+                operands.append(self.variable())
+
+            # operator: close parentheses until a binary operator or the end
+            while True:
+                precedence = BINARY_PRECEDENCE.get(self.current_token.type, 0)
+                self._reduce(operands, operators, max(precedence, 1))
+                if precedence:
+                    token = self.token()
+                    self.eat(token.type)
+                    operators.append((precedence, token))
+                    break
+                if not operators:
+                    return operands.pop()
+                # only the open parenthesis is left on top
+                self.eat(TokenType.RPAREN)
+                operators.pop()
+
+    @staticmethod
+    def _reduce(operands, operators, precedence):
+        """build the nodes of the operators on top of the stack that bind
+        at least as tightly as precedence, binary operators are left
+        associative
+        """
+        while operators and operators[-1][0] >= precedence:
+            op_precedence, token = operators.pop()
+            if op_precedence == UNARY_PRECEDENCE:
+                operands[-1] = nodes.UnaryOp(token, operands[-1])
+            else:
+                right = operands.pop()
+                operands[-1] = nodes.BinOp(left=operands[-1], op=token, right=right)
 
     """""""""""""""""""""""""""""""""""""""""
     --------    parser ast node    ---------
@@ -134,7 +140,7 @@ class Parser(object):
         self.eat(TokenType.SEMI)
         # block
         block_node = self.block()
-        program_node = ast.Program(program_name, block_node)
+        program_node = nodes.Program(program_name, block_node)
         # .
         self.eat(TokenType.DOT)
         return program_node
@@ -147,7 +153,7 @@ class Parser(object):
         declaration_nodes = self.declarations()
         # compound BEGIN...END
         compound_statement_node = self.compound_statement()
-        node = ast.Block(declaration_nodes, compound_statement_node)
+        node = nodes.Block(declaration_nodes, compound_statement_node)
         return node
 
     """declarations: var decl or procedure decl"""
@@ -187,13 +193,13 @@ class Parser(object):
             b : REAL;
         """
 
-        var_nodes = [ast.Var(self.current_token)]
+        var_nodes = [nodes.Var(self.token())]
         self.eat(TokenType.ID)
 
         # while contain ',' just like var a,b,c : INTEGER;
         while self.current_token.type == TokenType.COMMA:
             self.eat(TokenType.COMMA)
-            var_nodes.append(ast.Var(self.current_token))
+            var_nodes.append(nodes.Var(self.token()))
             self.eat(TokenType.ID)
         # :
         self.eat(TokenType.COLON)
@@ -202,7 +208,7 @@ class Parser(object):
         type_node = self.type_spec()
         # [a, INTEGER], [b, INTEGER] [c, float]
         var_declarations = [
-            ast.VarDecl(var_node, type_node)
+            nodes.VarDecl(var_node, type_node)
             for var_node in var_nodes
         ]
         return var_declarations
@@ -212,6 +218,7 @@ class Parser(object):
              PROCEDURE ID (LPAREN formal_parameter_list RPAREN)? SEMI block SEMI
         """
         self.eat(TokenType.PROCEDURE)
+        token = self.token()
         proc_name = self.current_token.value
         self.eat(TokenType.ID)
 
@@ -223,12 +230,12 @@ class Parser(object):
 
         self.eat(TokenType.SEMI)
         block_node = self.block()
-        proc_decl = ast.ProcedureDecl(proc_name, params, block_node)
+        proc_decl = nodes.ProcedureDecl(proc_name, params, block_node, token)
         self.eat(TokenType.SEMI)
         return proc_decl
 
     def empty(self):
-        return ast.NoOp()
+        return nodes.NoOp()
 
     """procedure's formal parameters"""
 
@@ -256,13 +263,13 @@ class Parser(object):
         current process is a, b : int
         """
         param_nodes = []
-        param_tokens = [self.current_token]
+        param_tokens = [self.token()]
         self.eat(TokenType.ID)
         # while contain ','
         while self.current_token.type == TokenType.COMMA:
             self.eat(TokenType.COMMA)
             # add all ID
-            param_tokens.append(self.current_token)
+            param_tokens.append(self.token())
             self.eat(TokenType.ID)
         # eat ':'
         self.eat(TokenType.COLON)
@@ -270,8 +277,8 @@ class Parser(object):
         # start params type
         type_node = self.type_spec()
         for param_token in param_tokens:
-            var = ast.Var(param_token)
-            param_node = ast.Param(var, type_node)
+            var = nodes.Var(param_token)
+            param_node = nodes.Param(var, type_node)
             param_nodes.append(param_node)
         return param_nodes
 
@@ -279,12 +286,12 @@ class Parser(object):
         """type_spec : INTEGER
                      | REAL
         """
-        token = self.current_token
+        token = self.token()
         if self.current_token.type == TokenType.INTEGER:
             self.eat(TokenType.INTEGER)
         else:
             self.eat(TokenType.REAL)
-        node = ast.Type(token)
+        node = nodes.Type(token)
         return node
 
     def proccall_statement(self):
@@ -293,14 +300,14 @@ class Parser(object):
         foo(a)
         """
 
-        token = self.current_token
+        token = self.token()
         proc_name = self.current_token.value
         self.eat(TokenType.ID)
         self.eat(TokenType.LPAREN)
 
         actual_params = []
         # append all actual params
-        if self.current_token.type != TokenType.LPAREN:
+        if self.current_token.type != TokenType.RPAREN:
             node = self.expr()
             actual_params.append(node)
 
@@ -311,18 +318,18 @@ class Parser(object):
 
         self.eat(TokenType.RPAREN)
 
-        node = ast.ProcedureCall(proc_name, actual_params, token)
+        node = nodes.ProcedureCall(proc_name, actual_params, token)
         return node
 
     def compound_statement(self):
         """compound_statement: BEGIN statement_list END
         """
         self.eat(TokenType.BEGIN)
-        nodes = self.statement_list()
+        statements = self.statement_list()
         self.eat(TokenType.END)
 
-        root = ast.Compound()
-        for node in nodes:
+        root = nodes.Compound()
+        for node in statements:
             root.children.append(node)
 
         return root
@@ -362,16 +369,30 @@ class Parser(object):
         just like a := 1;
         """
         left = self.variable()
-        token = self.current_token
+        token = self.token()
         # :=
         self.eat(TokenType.ASSIGN)
         right = self.expr()
-        node = ast.Assign(left, token, right)
+        node = nodes.Assign(left, token, right)
         return node
 
     def variable(self):
         """variable : ID
         """
-        node = ast.Var(self.current_token)
+        node = nodes.Var(self.token())
         self.eat(TokenType.ID)
         return node
+
+
+class StreamParser(Parser):
+    """parser over a TokenStream
+
+    the current token is a TokenCursor, so a Token is only created for
+    the tokens AST nodes keep and for errors
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream.cursor())
+
+    def token(self):
+        return self.current_token.token()
@@ -0,0 +1,306 @@
+"""
+profiling
+
+where the tree walking interpreter spends its time. ProfilingInterpreter
+times every visit, it is only used with --profile, so the Interpreter
+itself has no profiling code and costs nothing more when it is off.
+SamplingProfiler instead looks at a running Interpreter every few
+milliseconds of CPU time, for the hot source lines and call chains.
+
+times are in nanoseconds. self time is the time of a visit minus the
+visits it made, cumulative time includes them, so the cumulative time
+of a node type counts nested nodes of that type again (a BinOp in a
+BinOp). profiling makes the tree walker about 3-4x slower.
+"""
+import json
+import signal
+import time
+from collections import Counter
+
+import nodes
+from interpreter import BINARY_OPERATORS, Interpreter, UNARY_OPERATORS
+
+
+class NodeStats(object):
+    __slots__ = ('count', 'cumulative', 'self_time')
+
+    def __init__(self):
+        self.count = 0
+        self.cumulative = 0
+        self.self_time = 0
+
+    def add(self, other):
+        self.count += other.count
+        self.cumulative += other.cumulative
+        self.self_time += other.self_time
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'cumulative_ns': self.cumulative,
+            'self_ns': self.self_time,
+        }
+
+
+class ProfilingInterpreter(Interpreter):
+    """an Interpreter that records count, cumulative and self time of
+    every node it visits
+    """
+
+    def __init__(self, tree, timer=time.perf_counter_ns, memo=None):
+        super().__init__(tree, memo)
+        self.timer = timer
+        # node -> count, cumulative and self time, ints in plain dicts
+        # so recording allocates nothing the garbage collector tracks
+        self.counts = {}
+        self.cumulative = {}
+        self.self_times = {}
+        self._children = 0  # time of the visits made by the current one
+        self.elapsed = 0
+
+    def interpret(self):
+        start = self.timer()
+        try:
+            return super().interpret()
+        finally:
+            self.elapsed = self.timer() - start
+
+    def visit(self, node):
+        # the dispatch of NodeVisitor.visit inlined, this runs for every node
+        try:
+            visitor = self._visitors[node.__class__]
+        except KeyError:
+            visitor = self._resolve_visitor(node.__class__)
+        timer = self.timer
+        outer = self._children
+        self._children = 0
+        start = timer()
+        result = visitor(self, node)
+        elapsed = timer() - start
+        # an exception skips the bookkeeping, it ends the run anyway
+        counts = self.counts
+        if node in counts:
+            counts[node] += 1
+            self.cumulative[node] += elapsed
+            self.self_times[node] += elapsed - self._children
+        else:
+            counts[node] = 1
+            self.cumulative[node] = elapsed
+            self.self_times[node] = elapsed - self._children
+        self._children = outer + elapsed
+        return result
+
+    def visit_BinOp(self, node):
+        """calc the value, and time every operator of the expression:
+        the Interpreter evaluates a whole expression in one visit, which
+        would leave nothing to time
+
+        the operators are walked in post order with an explicit stack,
+        like the Interpreter does. An operator waiting for its operands
+        is on the stack as (node, start, outer), with the time it was
+        started at and the time of the visits its parent made before,
+        the bookkeeping of visit is done when its value is computed. The
+        first one is timed by the visit of the expression.
+        """
+        timer = self.timer
+        counts = self.counts
+        cumulative = self.cumulative
+        self_times = self.self_times
+        values = []
+        push = values.append
+        todo = [(node, None, 0)]
+        pending = todo.append
+        if node.__class__ is nodes.BinOp:
+            pending(node.right)
+            pending(node.left)
+        else:
+            pending(node.expr)
+        while todo:
+            node = todo.pop()
+            cls = node.__class__
+            if cls is tuple:
+                node, start, outer = node
+                if node.__class__ is nodes.BinOp:
+                    right = values.pop()
+                    values[-1] = BINARY_OPERATORS[node.op.type](values[-1], right)
+                else:
+                    values[-1] = UNARY_OPERATORS[node.op.type](values[-1])
+                if start is None:
+                    continue
+                elapsed = timer() - start
+                if node in counts:
+                    counts[node] += 1
+                    cumulative[node] += elapsed
+                    self_times[node] += elapsed - self._children
+                else:
+                    counts[node] = 1
+                    cumulative[node] = elapsed
+                    self_times[node] = elapsed - self._children
+                self._children = outer + elapsed
+            elif cls is nodes.BinOp:
+                pending((node, timer(), self._children))
+                self._children = 0
+                pending(node.right)
+                pending(node.left)
+            elif cls is nodes.UnaryOp:
+                pending((node, timer(), self._children))
+                self._children = 0
+                pending(node.expr)
+            else:
+                push(self.visit(node))
+        return values[0]
+
+    visit_UnaryOp = visit_BinOp
+
+    @property
+    def stats(self):
+        """node -> NodeStats"""
+        stats = {}
+        for node, count in self.counts.items():
+            node_stats = stats[node] = NodeStats()
+            node_stats.count = count
+            node_stats.cumulative = self.cumulative[node]
+            node_stats.self_time = self.self_times[node]
+        return stats
+
+    def by_node_type(self):
+        """node class name -> NodeStats"""
+        return self._group(lambda node: node.__class__.__name__)
+
+    def by_operator(self):
+        """TokenType name of the operator -> NodeStats, for the nodes with one"""
+        return self._group(lambda node: node.op.type.name if hasattr(node, 'op') else None)
+
+    def _group(self, key):
+        groups = {}
+        for node, stats in self.stats.items():
+            name = key(node)
+            if name is None:
+                continue
+            group = groups.get(name)
+            if group is None:
+                group = groups[name] = NodeStats()
+            group.add(stats)
+        return groups
+
+    def hottest(self, limit=10):
+        """the (node, NodeStats) with the most self time"""
+        items = sorted(self.stats.items(), key=lambda item: item[1].self_time, reverse=True)
+        return items[:limit]
+
+    def to_dict(self, limit=10):
+        return {
+            'elapsed_ns': self.elapsed,
+            'node_types': {name: stats.to_dict() for name, stats in self.by_node_type().items()},
+            'operators': {name: stats.to_dict() for name, stats in self.by_operator().items()},
+            'hottest': [
+                dict(node=node.__class__.__name__, position=position(node), **stats.to_dict())
+                for node, stats in self.hottest(limit)
+            ],
+        }
+
+    def write_json(self, file, limit=10):
+        with open(file, 'w') as f:
+            json.dump(self.to_dict(limit), f, indent=2)
+            f.write('\n')
+
+    def format_table(self, limit=10):
+        lines = [f'Profile: {self.elapsed / 1e6:.3f} ms']
+        lines += _table('node type', self.by_node_type(), self.elapsed)
+        lines += _table('operator', self.by_operator(), self.elapsed)
+        lines.append('')
+        lines.append(f'{"hottest nodes":<24}{"position":>10}{"count":>10}{"self ms":>12}{"self %":>8}')
+        for node, stats in self.hottest(limit):
+            lines.append(f'{node.__class__.__name__:<24}{position(node) or "-":>10}{stats.count:>10}'
+                         f'{stats.self_time / 1e6:>12.3f}{_percent(stats.self_time, self.elapsed):>8}')
+        return '\n'.join(lines)
+
+
+def position(node):
+    """'line:column' of the token of a node, None for the nodes without one"""
+    token = getattr(node, 'token', None)
+    if token is None or getattr(token, 'offset', None) is None:
+        return None
+    return f'{token.lineno}:{token.column}'
+
+
+def _percent(part, total):
+    return f'{100 * part / total:.1f}' if total else '-'
+
+
+def _table(title, groups, elapsed):
+    lines = [
+        '',
+        f'{title:<24}{"count":>10}{"cumul. ms":>12}{"self ms":>12}{"self %":>8}',
+    ]
+    for name, stats in sorted(groups.items(), key=lambda item: item[1].self_time, reverse=True):
+        lines.append(f'{name:<24}{stats.count:>10}{stats.cumulative / 1e6:>12.3f}'
+                     f'{stats.self_time / 1e6:>12.3f}{_percent(stats.self_time, elapsed):>8}')
+    return lines
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    sampling profiler    -------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+class SamplingProfiler(object):
+    """samples an Interpreter on SIGPROF, every interval seconds of CPU
+    time. a sample is the names of the activation records on the call
+    stack and the line of the innermost node being visited that has a
+    token, found in the locals of the visit_* frames.
+
+    the interpreter is not instrumented: the cost is the signal handler,
+    about 25us per sample. the kernel sends SIGPROF at most once per
+    clock tick (4ms with HZ=250), so shorter intervals sample every tick,
+    which is under 1% of the run time (benchmarks/sampling_overhead.py).
+    only one profiler can run at a time (there is one SIGPROF timer),
+    and only on Unix.
+    """
+
+    def __init__(self, interpreter, interval=0.001):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.samples = Counter()  # (frame names, ...) -> count
+        self._previous_handler = None
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self, signum, frame):
+        line = None
+        while frame is not None:
+            if frame.f_code.co_name.startswith('visit_'):
+                token = getattr(frame.f_locals.get('node'), 'token', None)
+                if token is not None and getattr(token, 'offset', None) is not None:
+                    line = f'line {token.lineno}'
+                    break
+            frame = frame.f_back
+        stack = self.interpreter.call_stack.names()
+        if line is not None:
+            stack.append(line)
+        if stack:
+            self.samples[tuple(stack)] += 1
+
+    def folded(self):
+        """the samples as folded stacks, one 'name;name;line count' per
+        line, the input of flamegraph.pl, speedscope, inferno...
+        """
+        return ''.join(f'{";".join(stack)} {count}\n'
+                       for stack, count in sorted(self.samples.items()))
+
+    def write_folded(self, file):
+        with open(file, 'w') as f:
+            f.write(self.folded())
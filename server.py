@@ -0,0 +1,324 @@
+"""
+Server
+a long running process that runs the programs sent to it as JSON
+requests, one per line, read from stdin or from the connections to a
+Unix socket, the responses are written back the same way
+
+    python main.py --serve [--socket PATH] [--workers N] [--serve-cache-size N]
+
+a request and its response:
+
+    {"id": 1, "source": "program P; var x, y : integer; begin y := x * 2 end.",
+     "bindings": {"x": 21}}
+    {"id": 1, "status": "ok", "variables": {"x": 21, "y": 42},
+     "diagnostics": [], "cached": false, "seconds": 0.0003}
+
+"path" names a file to read instead of "source", "optimize": true folds
+the constants first. A program that is invalid or fails when it runs
+gets the status "error" and diagnostics saying why, with the line and
+column when they are known.
+
+the requests of a connection are handled concurrently, a response is
+written as soon as it is ready and carries the id of its request. The
+programs are compiled and run in a process pool, the event loop only
+moves JSON lines, so it keeps answering while programs run. Each worker
+keeps the Sessions it compiled in an LRU keyed by the sha256 of the
+source: a program sent again skips lexing, parsing, the semantic
+analysis and the compilation, and costs a Session.run.
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import source_hash
+from error import Error
+from session import Session
+
+CACHE_SIZE = 128  # default number of programs a worker keeps compiled
+LINE_LIMIT = 64 * 2 ** 20  # longest request line read from a socket
+
+
+class SessionCache(object):
+    """the Sessions a worker compiled, by (source hash, optimize).
+    Holds at most maxsize of them, the least recently used one is
+    evicted for a new one.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError(f'cache size must be at least 1, not {maxsize}')
+        self.maxsize = maxsize
+        self.sessions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text, optimize=False):
+        """(the Session of the program, whether it was cached), the
+        program is compiled on a miss, errors are raised like Session does
+        """
+        key = (source_hash(text), optimize)
+        session = self.sessions.get(key)
+        if session is not None:
+            self.sessions.move_to_end(key)
+            self.hits += 1
+            return session, True
+        self.misses += 1
+        session = Session(text, optimize)
+        sessions = self.sessions
+        sessions[key] = session
+        if len(sessions) > self.maxsize:
+            sessions.popitem(last=False)
+            self.evictions += 1
+        return session, False
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    requests     ----------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+def check_request(request):
+    """what is wrong with a decoded request, None if it can be run"""
+    if not isinstance(request, dict):
+        return 'a request is a JSON object'
+    source, path = request.get('source'), request.get('path')
+    if (source is None) == (path is None):
+        return 'a request has either "source" or "path"'
+    if not isinstance(source if path is None else path, str):
+        return '"source" and "path" are strings'
+    bindings = request.get('bindings', {})
+    if not isinstance(bindings, dict):
+        return '"bindings" is an object'
+    for name, value in bindings.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f'the binding of {name} is not a number'
+    return None
+
+
+def diagnostic(exc):
+    """an error of the program, or of the request, as JSON"""
+    if isinstance(exc, Error):
+        return {
+            'error': exc.__class__.__name__,
+            'message': exc.message,
+            'line': exc.lineno,
+            'column': exc.column,
+        }
+    return {
+        'error': exc.__class__.__name__,
+        'message': str(exc),
+        'line': None,
+        'column': None,
+    }
+
+
+def error_response(request_id, exc):
+    return {
+        'id': request_id,
+        'status': 'error',
+        'variables': {},
+        'diagnostics': [diagnostic(exc)],
+        'cached': False,
+        'seconds': 0.0,
+    }
+
+
+_sessions = None  # the SessionCache of a worker process
+
+
+def init_worker(cache_size):
+    global _sessions
+    _sessions = SessionCache(cache_size)
+
+
+def execute(request):
+    """run a checked request in a worker, return its response"""
+    start = time.perf_counter()
+    request_id = request.get('id')
+    try:
+        text = request.get('source')
+        if text is None:
+            with open(request['path'], 'r') as f:
+                text = f.read()
+        session, cached = _sessions.get(text, bool(request.get('optimize')))
+        variables = session.run(**request.get('bindings', {}))
+    except Exception as e:
+        # LexerError, ParserError, SemanticError, ExecutionError, an
+        # unreadable path or a binding of an unknown variable or of the
+        # wrong type
+        response = error_response(request_id, e)
+        response['seconds'] = time.perf_counter() - start
+        return response
+    return {
+        'id': request_id,
+        'status': 'ok',
+        'variables': variables,
+        'diagnostics': [],
+        'cached': cached,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    server     ------------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+
+class Server(object):
+    """answers the request lines of stdin or of the connections to a
+    Unix socket, with the programs run in a pool of worker processes
+    """
+
+    def __init__(self, workers=None, cache_size=CACHE_SIZE):
+        if cache_size < 1:
+            raise ValueError(f'cache size must be at least 1, not {cache_size}')
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            self.workers, initializer=init_worker, initargs=(cache_size,))
+
+    def close(self):
+        """wait for the workers to exit"""
+        self.executor.shutdown(cancel_futures=True)
+
+    async def start_workers(self):
+        """fork the workers, the pool forks them all at its first call.
+        Make it before a thread reading stdin or a socket is started: a
+        worker forked while the reader holds the lock of sys.stdin waits
+        for it forever when multiprocessing closes stdin in the child.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, os.getpid)
+
+    async def respond(self, line):
+        """the response to one request line"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return error_response(None, e)
+        problem = check_request(request)
+        if problem is not None:
+            request_id = request.get('id') if isinstance(request, dict) else None
+            return error_response(request_id, ValueError(problem))
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, execute, request)
+        except Exception as e:
+            # the worker died, or the response can not be sent back
+            return error_response(request.get('id'), e)
+
+    async def serve(self, readline, write):
+        """answer the lines read until the end of the input, each one
+        as soon as its response is ready
+        """
+        pending = set()
+
+        async def answer(line):
+            response = await self.respond(line)
+            await write(json.dumps(response) + '\n')
+
+        while True:
+            line = await readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.ensure_future(answer(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def serve_stdio(self):
+        """answer the lines of stdin on stdout, until stdin is closed,
+        then close stdout once the last response is written
+        """
+        await self.start_workers()
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+
+        def read():
+            # a blocking read in a daemon thread, it works for a pipe, a
+            # terminal or a file and does not keep the process alive
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(lines.put_nowait, line)
+            loop.call_soon_threadsafe(lines.put_nowait, '')
+
+        async def write(text):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        threading.Thread(target=read, daemon=True).start()
+        await self.serve(lines.get, write)
+        # the client reading the responses sees the end of them now,
+        # not after the workers exit
+        sys.stdout.close()
+
+    async def serve_unix(self, path):
+        """answer the connections to a Unix socket at path, until the
+        process gets SIGTERM or SIGINT
+        """
+
+        connections = set()  # the tasks serving a connection
+
+        async def connection(reader, writer):
+            async def write(text):
+                writer.write(text.encode('utf-8'))
+                await writer.drain()
+
+            task = asyncio.current_task()
+            connections.add(task)
+            try:
+                await self.serve(reader.readline, write)
+            except (ConnectionError, ValueError):
+                # the client went away, or sent a line over LINE_LIMIT
+                pass
+            except asyncio.CancelledError:
+                # the server is stopping, end like a closed connection:
+                # the stream protocol asks a cancelled task for its
+                # exception, which raises
+                pass
+            finally:
+                connections.discard(task)
+                writer.close()
+
+        # before the socket is opened too: a worker would keep it open
+        # when forked after
+        await self.start_workers()
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_unix_server(connection, path, limit=LINE_LIMIT)
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+            # the requests in progress are dropped with their connection
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def serve(workers=None, cache_size=CACHE_SIZE, socket=None):
+    """run a Server on stdin/stdout, or on a Unix socket"""
+    server = Server(workers, cache_size)
+    try:
+        if socket is None:
+            asyncio.run(server.serve_stdio())
+        else:
+            asyncio.run(server.serve_unix(socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,90 @@
+"""
+Session
+a program embedded in Python: compiled once, then run as many times as
+needed, each run with its own variable values
+
+    >>> session = Session('program P; var x, y : integer; begin y := x * 2 end.')
+    >>> session.run(x=21)
+    {'x': 21, 'y': 42}
+    >>> session.run(x=1)
+    {'x': 1, 'y': 2}
+
+lexing, parsing, the semantic analysis and the compilation into
+closures happen once in the constructor, a run only makes a fresh
+activation record, so it costs microseconds. The symbol tables are not
+rebuilt, and the builtin type symbols are shared by all programs.
+"""
+import nodes
+from closure import ClosureCompiler
+from interpreter import ActivationRecord, ARType, CallStack, INTEGER, REAL, SemanticAnalyzer
+from lexer import RegexLexer
+from optimizer import Optimizer
+from parser import StreamParser
+
+
+class Session(object):
+    """raises LexerError, ParserError or SemanticError for an invalid
+    program, like main.py reports them
+    """
+
+    def __init__(self, text, optimize=False):
+        tree = StreamParser(RegexLexer(text).tokenize()).parse()
+        SemanticAnalyzer().visit(tree)
+        if optimize:
+            tree = Optimizer().optimize(tree)
+        self.tree = tree
+        self.name = tree.name
+        self.var_slots = tree.var_slots
+        self.var_types = {
+            declaration.var_node.value: declaration.type_node.value
+            for declaration in tree.block.declarations
+            if isinstance(declaration, nodes.VarDecl)
+        }
+        self.program = ClosureCompiler().compile(tree)
+
+    @classmethod
+    def from_file(cls, path, optimize=False):
+        with open(path, 'r') as f:
+            return cls(f.read(), optimize)
+
+    @property
+    def variables(self):
+        """the names of the program's variables, in declaration order"""
+        return list(self.var_slots)
+
+    def bound(self, name, value):
+        """the value a binding stores in the variable name: an INTEGER
+        takes an int, a REAL an int or a float, stored as a float like
+        an assignment stores it
+        """
+        type_name = self.var_types[name]
+        if type(value) is not bool:
+            if type_name == INTEGER and isinstance(value, int):
+                return value
+            if type_name == REAL and isinstance(value, (int, float)):
+                try:
+                    return float(value)
+                except OverflowError:
+                    raise ValueError(f"the binding of '{name}' is too large for a REAL") from None
+        raise ValueError(f"variable '{name}' is {type_name}, not {type(value).__name__}")
+
+    def run(self, /, **bindings):
+        """run the program with the variables in bindings set first,
+        return the variables that have a value at the end, by name.
+        raises ValueError for a binding of an unknown variable, or of a
+        value its type can not hold
+        """
+        ar = ActivationRecord(
+            name=self.name,
+            type=ARType.PROGRAM,
+            nesting_level=1,
+            var_slots=self.var_slots,
+        )
+        slots = ar.slots
+        for name, value in bindings.items():
+            slot = self.var_slots.get(name)
+            if slot is None:
+                raise ValueError(f"program {self.name} has no variable '{name}'")
+            slots[slot] = self.bound(name, value)
+        self.program(CallStack(), ar)
+        return ar.members
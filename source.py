@@ -0,0 +1,88 @@
+"""
+Source
+the program character read chunk by chunk, so the lexer does not
+need the whole program in memory
+"""
+import codecs
+import mmap
+import os
+
+CHUNK_SIZE = 64 * 1024  # characters (or bytes for mmap) per chunk
+
+
+class Source(object):
+    """a program source, read() returns the next chunk of text
+    and '' at the end
+    """
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextSource(Source):
+    """chunks of a str already in memory"""
+
+    def __init__(self, text, chunk_size=CHUNK_SIZE):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.pos = 0
+
+    def read(self):
+        chunk = self.text[self.pos:self.pos + self.chunk_size]
+        self.pos += len(chunk)
+        return chunk
+
+
+class FileSource(Source):
+    """chunks read from a text file object, or from a path"""
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self._owned = isinstance(file, (str, bytes, os.PathLike))
+        self.file = open(file, 'r') if self._owned else file
+        self.chunk_size = chunk_size
+
+    def read(self):
+        return self.file.read(self.chunk_size)
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+
+
+class MmapSource(Source):
+    """chunks decoded from a mmap'd file, the pages are loaded by the
+    OS when they are read and can be dropped again after that
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE, encoding='utf-8'):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        # an empty file can not be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.chunk_size = chunk_size
+        self.pos = 0
+        # a multi-byte character may be split by a chunk boundary
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+
+    def read(self):
+        while self.pos < len(self.map):
+            data = self.map[self.pos:self.pos + self.chunk_size]
+            self.pos += len(data)
+            chunk = self.decoder.decode(data, final=self.pos >= len(self.map))
+            if chunk:
+                return chunk
+        return ''
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
@@ -0,0 +1,141 @@
+"""
+the engines run an arena's views like the tree they were made from
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import nodes  # noqa: E402
+from arena import NODE_TYPES, NodeArena  # noqa: E402
+from bytecode import Compiler, VM  # noqa: E402
+from closure import ClosureInterpreter  # noqa: E402
+from generator import ProgramGenerator  # noqa: E402
+from interpreter import Interpreter, NodeVisitor, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from tracing import CALL_STACK, tracer  # noqa: E402
+
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'bytecode': lambda tree: VM(Compiler().compile(tree)),
+}
+
+with open(os.path.join(ROOT, 'example.pas')) as f:
+    EXAMPLE = f.read()
+
+NESTED = """
+program Nested;
+var x, y : integer;
+    r : real;
+procedure Outer(a : integer; b : real);
+var c : integer;
+   procedure Inner(d : integer);
+   begin
+      c := d * 2;
+      x := x + c;
+      r := r / b
+   end;
+begin
+   c := a;
+   Inner(c + 1);
+   y := -c DIV 3
+end;
+begin
+   x := 1;
+   r := 10;
+   Outer(x, 2.5);
+   Outer(-x, -0.5)
+end.
+"""
+
+PROGRAMS = {
+    'example': EXAMPLE,
+    'nested': NESTED,
+    'generated': ProgramGenerator(statements=200, depth=4, procedures=6, nesting=3).generate(),
+}
+
+
+class DumpSink(object):
+    """keeps every call stack dump, the records as dicts"""
+
+    def __init__(self):
+        self.dumps = []
+
+    def write(self, category, event, message, fields):
+        self.dumps.append(fields['records'])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def checked(text, optimize):
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    if optimize:
+        tree = Optimizer().optimize(tree)
+    return tree
+
+
+def dumps(tree, engine):
+    sink = DumpSink()
+    tracer.enable([CALL_STACK], sink)
+    try:
+        ENGINES[engine](tree).interpret()
+    finally:
+        tracer.disable()
+    return sink.dumps
+
+
+@pytest.mark.parametrize('optimize', (False, True))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_arena_same_as_tree(name, engine, optimize):
+    text = PROGRAMS[name]
+    expected = dumps(checked(text, optimize), engine)
+    assert expected
+    arena = NodeArena.from_tree(checked(text, optimize))
+    assert dumps(arena.root, engine) == expected
+
+
+class Counter(NodeVisitor):
+    """counts the nodes it visits by class"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def generic_visit(self, node):
+        self.counts[node.__class__] = self.counts.get(node.__class__, 0) + 1
+        for child in nodes.iter_child_nodes(node):
+            self.visit(child)
+
+    def visit_BinOp(self, node):
+        self.counts['BinOp'] = self.counts.get('BinOp', 0) + 1
+        self.generic_visit(node)
+
+
+def test_views_dispatch():
+    tree = checked(NESTED, False)
+    arena = NodeArena.from_tree(checked(NESTED, False))
+    root = arena.root
+    assert type(root) is not nodes.Program
+    assert root.__class__ is nodes.Program and isinstance(root, nodes.Program)
+
+    expected = Counter()
+    expected.visit(tree)
+    counter = Counter()
+    counter.visit(root)
+    assert counter.counts == expected.counts
+    assert counter.counts['BinOp'] == counter.counts[nodes.BinOp]
+    # the methods are cached for the node classes, not for the views
+    assert set(Counter._visitors) <= set(NODE_TYPES)
+    assert Counter._visitors[nodes.BinOp] is Counter.visit_BinOp
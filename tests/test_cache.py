@@ -0,0 +1,113 @@
+"""
+the program cache: hits for the same source, misses for a changed,
+corrupt or stale entry
+"""
+import os
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nodes  # noqa: E402
+from bytecode import Compiler  # noqa: E402
+from cache import CACHE_DIR, MAGIC, ProgramCache  # noqa: E402
+from interpreter import SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+
+PROGRAM = 'program P; var x : integer; begin x := {} end.'
+
+
+def checked(text):
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    return tree
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def entries(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_hit(tmp_path):
+    text = PROGRAM.format(1)
+    filename = write(tmp_path / 'p.pas', text)
+    tree = checked(text)
+    cache = ProgramCache()
+    assert cache.load_tree(filename, text) is None
+    assert cache.store_tree(filename, text, tree)
+    assert cache.store_code(filename, text, Compiler().compile(tree))
+
+    cache = ProgramCache()
+    loaded = cache.load_tree(filename, text)
+    assert nodes.count_nodes(loaded) == nodes.count_nodes(tree)
+    assert cache.load_code(filename, text).name == 'P'
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_miss_after_change(tmp_path):
+    old, new = PROGRAM.format(1), PROGRAM.format(2)
+    filename = write(tmp_path / 'p.pas', old)
+    cache = ProgramCache()
+    cache.store_tree(filename, old, checked(old))
+    write(tmp_path / 'p.pas', new)
+    assert cache.load_tree(filename, new) is None
+    assert cache.misses == 1
+
+    # the entry of the old version is replaced by the new one
+    cache.store_tree(filename, new, checked(new))
+    assert len(entries(tmp_path / CACHE_DIR)) == 1
+    assert cache.load_tree(filename, new) is not None
+    assert cache.load_tree(filename, old) is None
+
+
+def test_same_name_in_shared_directory(tmp_path):
+    cache = ProgramCache(str(tmp_path / 'cache'))
+    texts = [PROGRAM.format(i) for i in range(2)]
+    filenames = [write(tmp_path / str(i) / 'p.pas', text) for i, text in enumerate(texts)]
+    for filename, text in zip(filenames, texts):
+        cache.store_tree(filename, text, checked(text))
+    for filename, text in zip(filenames, texts):
+        assert cache.load_tree(filename, text) is not None
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_corrupt_entry(tmp_path):
+    text = PROGRAM.format(1)
+    filename = write(tmp_path / 'p.pas', text)
+    cache = ProgramCache()
+    cache.store_tree(filename, text, checked(text))
+    (entry,) = entries(tmp_path / CACHE_DIR)
+    path = tmp_path / CACHE_DIR / entry
+    data = path.read_bytes()
+
+    # a payload cut short, then one that is not a pickled tree
+    path.write_bytes(data[:-10])
+    assert cache.load_tree(filename, text) is None
+    header = len(MAGIC) + 32
+    path.write_bytes(data[:header] + zlib.compress(b'not a tree'))
+    assert cache.load_tree(filename, text) is None
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_stale_entry(tmp_path):
+    text = PROGRAM.format(1)
+    filename = write(tmp_path / 'p.pas', text)
+    cache = ProgramCache()
+    cache.store_tree(filename, text, checked(text))
+    (entry,) = entries(tmp_path / CACHE_DIR)
+    path = tmp_path / CACHE_DIR / entry
+
+    # the header hash of another source, or a header of another format
+    data = path.read_bytes()
+    header = len(MAGIC) + 32
+    path.write_bytes(MAGIC + bytes(32) + data[header:])
+    assert cache.load_tree(filename, text) is None
+    path.write_bytes(b'NANC0\n' + data[len(MAGIC):])
+    assert cache.load_tree(filename, text) is None
+    assert cache.misses == 2
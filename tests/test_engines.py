@@ -0,0 +1,314 @@
+"""
+the four engines run the same programs to the same variables
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bytecode import Compiler, VM  # noqa: E402
+from closure import ClosureInterpreter  # noqa: E402
+from error import ErrorCode, ExecutionError, SemanticError  # noqa: E402
+from interpreter import Interpreter, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from tracing import CALL_STACK, tracer  # noqa: E402
+from transpiler import PythonInterpreter  # noqa: E402
+
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'bytecode': lambda tree: VM(Compiler().compile(tree)),
+    'python': PythonInterpreter,
+}
+
+
+class RecordSink(object):
+    """keeps the variables of the program from the call stack dump"""
+
+    def __init__(self):
+        self.members = None
+
+    def write(self, category, event, message, fields):
+        self.members = fields['records'][-1]['members']
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def checked(text, optimize=False):
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    if optimize:
+        tree = Optimizer().optimize(tree)
+    return tree
+
+
+def run(text, engine, optimize=False):
+    """the program's variables after a run on engine"""
+    tree = checked(text, optimize)
+    sink = RecordSink()
+    tracer.enable([CALL_STACK], sink)
+    try:
+        ENGINES[engine](tree).interpret()
+    finally:
+        tracer.disable()
+    return sink.members
+
+
+PARAMS = """
+program Params;
+var x, y : integer;
+procedure P(a, b : integer);
+begin
+   x := a;
+   y := b
+end;
+begin
+   P(1, 2)
+end.
+"""
+
+DUPLICATE_PARAMS = """
+program Duplicate;
+var x : integer;
+procedure P(a, a : integer);
+begin
+   x := a
+end;
+begin
+   P(1, 2)
+end.
+"""
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_params_bound_by_position(engine):
+    assert run(PARAMS, engine) == {'x': 1, 'y': 2}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_duplicate_params(engine):
+    with pytest.raises(SemanticError) as info:
+        run(DUPLICATE_PARAMS, engine)
+    assert info.value.error_code == ErrorCode.DUPLICATE_ID
+    assert info.value.lineno == 4
+
+
+DUPLICATE_PROCEDURE = """
+program Duplicate;
+var x : integer;
+procedure P;
+begin
+   x := 1
+end;
+procedure P;
+begin
+   x := 2
+end;
+begin
+   P()
+end.
+"""
+
+PROCEDURE_NAMED_LIKE_VARIABLE = """
+program Duplicate;
+var x : integer;
+procedure x;
+begin
+end;
+begin
+   x := 1
+end.
+"""
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('text, lineno', [
+    (DUPLICATE_PROCEDURE, 8),
+    (PROCEDURE_NAMED_LIKE_VARIABLE, 4),
+])
+def test_duplicate_procedure(engine, text, lineno):
+    with pytest.raises(SemanticError) as info:
+        run(text, engine)
+    assert info.value.error_code == ErrorCode.DUPLICATE_ID
+    assert info.value.lineno == lineno
+
+
+def wide_program(count):
+    """count globals, the last one set by a procedure"""
+    names = ', '.join(f'v{i}' for i in range(count))
+    return (f'program Wide;\nvar {names} : integer;\n'
+            f'procedure P;\nbegin\n   v{count - 1} := 5\nend;\n'
+            f'begin\n   P()\nend.\n')
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_slot_over_16_bits(engine):
+    assert run(wide_program(70000), engine) == {'v69999': 5}
+
+
+def typed(members):
+    """the variables as reprs, for == 3 and 3.0 are equal, and 0.0 and -0.0"""
+    return {name: repr(value) for name, value in members.items()}
+
+
+WIDEN = """
+program Widen;
+var i : integer;
+    r, s, t, u : real;
+procedure P(a : real; b : integer);
+var c : real;
+begin
+   c := a;
+   u := c
+end;
+begin
+   i := 2;
+   r := 3;
+   s := i * 4;
+   t := -i;
+   P(i + 1, 5)
+end.
+"""
+
+
+@pytest.mark.parametrize('optimize', (False, True))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_integer_widened_to_real(engine, optimize):
+    assert typed(run(WIDEN, engine, optimize)) == typed(
+        {'i': 2, 'r': 3.0, 's': 8.0, 't': -2.0, 'u': 3.0})
+
+
+SIMPLIFIED = """
+program Simplified;
+var i, j : integer;
+    r, s, t, u, v : real;
+begin
+   i := 3;
+   r := 3;
+   s := r / 1;
+   t := r * 1.0 + 1.0 * r;
+   u := (i * 1 + 0 - 0) / 1 + i DIV 1;
+   v := -0.0 * 1.0;
+   j := 1 * i - 0
+end.
+"""
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_optimized_same_as_unoptimized(engine):
+    expected = run(SIMPLIFIED, engine)
+    assert typed(expected)['s'] == '3.0'
+    assert typed(run(SIMPLIFIED, engine, optimize=True)) == typed(expected)
+
+
+OVERFLOW = f"""
+program Overflow;
+var r : real;
+begin
+   r := {10 ** 400} / 3
+end.
+"""
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_overflow_not_folded(engine):
+    with pytest.raises(ExecutionError):
+        run(OVERFLOW, engine, optimize=True)
+
+
+def deep_program(depth):
+    """an expression nested depth times, over the recursion limit"""
+    nested = '(' * depth + 'a' + ' + 1)' * depth
+    return (f'program Deep;\nvar a, b, c : integer;\n'
+            f'begin\n   a := 1;\n   b := {nested};\n   c := {"- " * depth}b\nend.\n')
+
+
+# the python engine compiles an expression recursively
+@pytest.mark.parametrize('engine', ('tree', 'closure', 'bytecode'))
+def test_deep_expression_optimized(engine):
+    depth = sys.getrecursionlimit() * 5
+    assert run(deep_program(depth), engine, optimize=True) == {
+        'a': 1, 'b': depth + 1, 'c': depth + 1}
+
+
+ZEROS = """
+program Zeros;
+var a, b, c : real;
+begin
+   a := 0.0;
+   b := -0.0;
+   c := -a
+end.
+"""
+
+
+@pytest.mark.parametrize('optimize', (False, True))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_signed_zeros(engine, optimize):
+    assert typed(run(ZEROS, engine, optimize)) == typed({'a': 0.0, 'b': -0.0, 'c': -0.0})
+
+
+FAILING = """
+program Failing;
+var x : integer;
+procedure P(a : integer);
+begin
+   x := a DIV 0
+end;
+begin
+   P(1)
+end.
+"""
+
+
+@pytest.mark.parametrize('engine', ('tree', 'bytecode'))
+def test_failed_call_releases_record(engine):
+    machine = ENGINES[engine](checked(FAILING))
+    with pytest.raises(ExecutionError):
+        machine.interpret()
+    assert 'P' not in machine.call_stack.names()
+    pool, = machine.pools.values() if engine == 'tree' else machine.pools
+    assert len(pool.free) == 1
+
+
+def flat_sum(terms):
+    """a sum of terms operands, one expression with no parentheses"""
+    return f'program Flat;\nvar a, b : integer;\nbegin\n   a := 1;\n   b := {" + ".join(["a"] * terms)}\nend.\n'
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_flat_sum(engine):
+    assert run(flat_sum(300), engine) == {'a': 1, 'b': 300}
+
+
+NON_FINITE = f"""
+program NonFinite;
+var r, s, t : real;
+begin
+   r := {'9' * 400}.0 * 1.0;
+   s := -r;
+   t := r + s
+end.
+"""
+
+
+@pytest.mark.parametrize('optimize', (False, True))
+@pytest.mark.parametrize('engine', ENGINES)
+def test_non_finite_reals(engine, optimize):
+    assert typed(run(NON_FINITE, engine, optimize)) == typed(
+        {'r': float('inf'), 's': float('-inf'), 't': float('nan')})
+
+
+def test_python_too_deep():
+    nested = 'a - (' * 300 + 'a' + ')' * 300
+    text = f'program Deep;\nvar a, b : integer;\nbegin\n   a := 1;\n   b := {nested}\nend.\n'
+    with pytest.raises(ExecutionError):
+        PythonInterpreter(checked(text))
@@ -0,0 +1,117 @@
+"""
+the stream and the parallel lexers give the tokens and errors of the
+whole text lexer, whatever the chunks the source is read or split in
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from error import LexerError  # noqa: E402
+import lexer  # noqa: E402
+from lexer import RegexLexer, StreamLexer, lex_parallel, split_source  # noqa: E402
+from source import TextSource  # noqa: E402
+from tokens import TokenType  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, 'example.pas')) as f:
+    EXAMPLE = f.read()
+
+TEXTS = {
+    'example': EXAMPLE,
+    # numbers, := and // and identifiers long enough to span chunks
+    'lexemes': 'program Lexemes;\nvar alpha_is_long, b2 : real;\nbegin\n'
+               '   alpha := 123456 + 3.14159 * 10. - b2 // 7;\n'
+               '   b2:=alpha DIV 42\nend.\n',
+    # comments between, before and after lexemes, over several lines
+    'comments': '{ a comment\nover lines } program {x}C; {}{ two }begin\n'
+                '   c {in an assignment} := {here too}1\nend. { the end }',
+    'empty': '',
+    'blank': ' \n\t ',
+    'bad character': 'program Bad;\nbegin\n   x := 1 ? 2\nend.',
+    'unclosed comment': 'program Open;\nbegin { the comment goes on\n to the end',
+}
+
+
+def tokens(lexer):
+    """the tokens of a lexer up to EOF, then the error it raised if any"""
+    result = []
+    try:
+        while True:
+            token = lexer.get_next_token()
+            result.append((token.type, token.value, token.lineno, token.column))
+            if token.type == TokenType.EOF:
+                return result
+    except LexerError as e:
+        result.append(e.message)
+        return result
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 3, 5, 64 * 1024))
+@pytest.mark.parametrize('name', TEXTS)
+def test_stream_same_as_whole_text(name, chunk_size):
+    text = TEXTS[name]
+    expected = tokens(RegexLexer(text))
+    assert tokens(StreamLexer(TextSource(text, chunk_size))) == expected
+
+
+def test_errors_reported():
+    assert tokens(RegexLexer(TEXTS['bad character']))[-1] == (
+        "LexerError: Lexer error on '?' line: 3 column: 11")
+    assert tokens(RegexLexer(TEXTS['unclosed comment']))[-1] == (
+        "LexerError: Lexer error on '{' line: 2 column: 7")
+
+
+# comments full of spaces and operators with none around them, so a
+# split point in the middle of the text would cut them
+PACKED = 'program Packed;\nvar a, b : integer;\nbegin\n' + ''.join(
+    f'   {{ comment {i} with : = and spaces }}a:=b+{i}*(a-{i})//3;b:=a\n' for i in range(200)
+) + 'end.\n'
+
+
+def stream_tokens(text, lex):
+    """the tokens of the stream lex returns for text, or its error"""
+    try:
+        stream = lex(text)
+    except LexerError as e:
+        return e.message
+    return [
+        (token.type, token.value, token.lineno, token.column)
+        for token in map(stream.token, range(len(stream)))
+    ]
+
+
+@pytest.mark.parametrize('parts', (2, 3, 7, 50, 1000))
+@pytest.mark.parametrize('name', ('example', 'comments', 'packed'))
+def test_split_points(name, parts):
+    text = PACKED if name == 'packed' else TEXTS[name]
+    bounds = split_source(text, parts)
+    assert bounds[0] == 0 and bounds[-1] == len(text)
+    assert bounds == sorted(set(bounds))
+    for bound in bounds[1:-1]:
+        # a whitespace character outside of a comment
+        assert text[bound].isspace()
+        assert text.rfind('{', 0, bound) <= text.rfind('}', 0, bound)
+    # no lexeme is cut: the chunks lexed apart give the tokens of the text
+    whole = stream_tokens(text, lambda text: RegexLexer(text).tokenize())
+    pieces = [
+        token for start, end in zip(bounds, bounds[1:])
+        for token in stream_tokens(text[start:end], lambda text: RegexLexer(text).tokenize())
+        if token[0] != TokenType.EOF
+    ]
+    assert [token[:2] for token in pieces] == [token[:2] for token in whole[:-1]]
+
+
+@pytest.mark.parametrize('text', (
+    EXAMPLE,
+    PACKED,
+    PACKED.replace('b+150', 'b+150 ?'),
+    PACKED + '{ never closed',
+))
+def test_parallel_same_as_whole_text(monkeypatch, text):
+    monkeypatch.setattr(lexer, 'PARALLEL_MIN_SIZE', 0)
+    expected = stream_tokens(text, lambda text: RegexLexer(text).tokenize())
+    assert stream_tokens(text, lambda text: lex_parallel(text, workers=2)) == expected
@@ -0,0 +1,36 @@
+"""
+main.py command line arguments
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+EXAMPLE = os.path.join(ROOT, 'example.pas')
+TIMEOUT = 60
+
+
+def main(*arguments):
+    return subprocess.run(
+        [sys.executable, MAIN, *arguments, EXAMPLE],
+        capture_output=True, text=True, timeout=TIMEOUT,
+    )
+
+
+def test_trace_file(tmp_path):
+    trace_file = tmp_path / 'trace.jsonl'
+    result = main('--trace', 'scope', '--trace-file', str(trace_file))
+    assert result.returncode == 0, result.stderr
+    events = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert events
+    assert {event['category'] for event in events} == {'scope'}
+
+
+def test_trace_file_without_trace(tmp_path):
+    trace_file = tmp_path / 'trace.jsonl'
+    result = main('--trace-file', str(trace_file))
+    assert result.returncode == 2
+    assert '--trace-file needs --trace or --scope' in result.stderr
+    assert not trace_file.exists()
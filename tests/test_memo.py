@@ -0,0 +1,90 @@
+"""
+the MemoCache of the tree interpreter: the calls of pure procedures hit
+it, and give the records they would compute
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter import Interpreter, MemoCache, SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from tracing import CALL_STACK, tracer  # noqa: E402
+
+
+class DumpSink(object):
+    """keeps the variables of the innermost record of every call stack
+    dump, a procedure's when it returns
+    """
+
+    def __init__(self):
+        self.members = []
+
+    def write(self, category, event, message, fields):
+        self.members.append(fields['records'][0]['members'])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run(text, memo=None):
+    """(the variables of each record when it is left, the memo)"""
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    sink = DumpSink()
+    tracer.enable([CALL_STACK], sink)
+    try:
+        Interpreter(tree, memo).interpret()
+    finally:
+        tracer.disable()
+    return sink.members, memo
+
+
+def calls(body, args):
+    return f"""
+program Calls;
+var x : real;
+procedure P(a : real);
+var b : real;
+begin
+   {body}
+end;
+begin
+   x := 1;
+   {'; '.join(f'P({arg})' for arg in args)}
+end.
+"""
+
+
+def test_hits():
+    text = calls('b := a * 2', ['1', '2', '1', '1'])
+    members, memo = run(text, MemoCache())
+    assert members == run(text)[0]
+    assert (memo.hits, memo.misses, memo.evictions) == (2, 2, 0)
+
+
+def test_evictions():
+    text = calls('b := a * 2', ['1', '2', '1', '3', '1'])
+    members, memo = run(text, MemoCache(maxsize=1))
+    assert members == run(text)[0]
+    assert (memo.hits, memo.misses, memo.evictions) == (0, 5, 4)
+    assert len(memo.entries) == 1
+
+
+def test_impure_not_memoized():
+    # it writes a variable of the program
+    text = calls('x := x + a', ['1', '1', '1'])
+    members, memo = run(text, MemoCache())
+    assert members[-1] == {'x': 4.0}
+    assert (memo.hits, memo.misses) == (0, 0)
+
+
+def test_signed_zero_arguments():
+    text = calls('b := a', ['0.0', '-0.0', '0.0', '-0.0'])
+    members, memo = run(text, MemoCache())
+    assert [repr(record['b']) for record in members[:-1]] == ['0.0', '-0.0', '0.0', '-0.0']
+    assert (memo.hits, memo.misses) == (2, 2)
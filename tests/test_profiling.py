@@ -0,0 +1,49 @@
+"""
+the ProfilingInterpreter times every node the Interpreter evaluates,
+without recursing per operator
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter import SemanticAnalyzer  # noqa: E402
+from lexer import RegexLexer  # noqa: E402
+from parser import StreamParser  # noqa: E402
+from profiling import ProfilingInterpreter  # noqa: E402
+
+
+def profiled(text):
+    tree = StreamParser(RegexLexer(text).tokenize()).parse()
+    SemanticAnalyzer().visit(tree)
+    interpreter = ProfilingInterpreter(tree)
+    interpreter.interpret()
+    return interpreter
+
+
+def test_every_operator_timed():
+    interpreter = profiled('program P; var a, b : integer; begin a := 2; b := -(a + 3) * a - -1 end.')
+    node_types = interpreter.by_node_type()
+    assert node_types['BinOp'].count == 3
+    assert node_types['UnaryOp'].count == 2
+    assert node_types['Var'].count == 2
+    assert node_types['Num'].count == 3
+    operators = interpreter.by_operator()
+    assert {name: stats.count for name, stats in operators.items()} == {
+        'ASSIGN': 2, 'MINUS': 3, 'PLUS': 1, 'MUL': 1}
+    for stats in interpreter.stats.values():
+        assert 0 <= stats.self_time <= stats.cumulative
+    # the self times add up to the time of the program's visit
+    program = interpreter.tree
+    assert sum(stats.self_time for stats in interpreter.stats.values()) == (
+        interpreter.stats[program].cumulative)
+
+
+def test_deep_expression():
+    depth = sys.getrecursionlimit() * 5
+    nested = '(' * depth + 'a' + ' + 1)' * depth
+    interpreter = profiled(
+        f'program P; var a, b, c : integer; begin a := 1; b := {nested}; c := {"- " * depth}b end.')
+    operators = interpreter.by_operator()
+    assert operators['PLUS'].count == depth
+    assert operators['MINUS'].count == depth
@@ -0,0 +1,50 @@
+"""
+main.py --serve answers the request lines of stdin and exits at their end
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+TIMEOUT = 60
+
+
+def serve(lines):
+    """the responses to the request lines, by id, after the server exited"""
+    server = subprocess.run(
+        [sys.executable, MAIN, '--serve', '--workers', '1'],
+        input=''.join(line + '\n' for line in lines),
+        capture_output=True, text=True, timeout=TIMEOUT,
+    )
+    assert server.returncode == 0, server.stderr
+    responses = [json.loads(line) for line in server.stdout.splitlines()]
+    assert len(responses) == len(lines)
+    return {response['id']: response for response in responses}
+
+
+def test_requests(tmp_path):
+    source = 'program P; var x, y : integer; begin y := x * 2 end.'
+    responses = serve([
+        json.dumps({'id': 1, 'source': source, 'bindings': {'x': 21}}),
+        '{"id": 2, "source": ',
+        json.dumps({'id': 3, 'path': str(tmp_path / 'missing.pas')}),
+        json.dumps({'id': 4, 'source': source, 'bindings': {'x': 1}}),
+    ])
+
+    assert responses[1]['status'] == 'ok'
+    assert responses[1]['variables'] == {'x': 21, 'y': 42}
+    assert responses[4]['variables'] == {'x': 1, 'y': 2}
+    assert responses[4]['cached']
+
+    # a line that is not JSON has no id to answer with
+    assert responses[None]['status'] == 'error'
+    assert responses[None]['diagnostics'][0]['error'] == 'JSONDecodeError'
+
+    assert responses[3]['status'] == 'error'
+    assert responses[3]['diagnostics'][0]['error'] == 'FileNotFoundError'
+
+
+def test_exit_at_end_of_input():
+    assert serve([]) == {}
@@ -0,0 +1,45 @@
+"""
+the bindings of a Session run are checked against the variable types
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import execute, init_worker  # noqa: E402
+from session import Session  # noqa: E402
+
+PROGRAM = 'program P; var i : integer; r : real; begin end.'
+
+
+def test_bindings_stored():
+    variables = Session(PROGRAM).run(i=2, r=3)
+    assert variables == {'i': 2, 'r': 3.0}
+    assert type(variables['r']) is float
+
+
+@pytest.mark.parametrize('bindings', [
+    {'i': 1.5}, {'i': True}, {'r': False}, {'r': '1'}, {'r': 10 ** 400}, {'x': 1},
+])
+def test_bad_bindings(bindings):
+    with pytest.raises(ValueError):
+        Session(PROGRAM).run(**bindings)
+
+
+@pytest.mark.parametrize('expression, value', [
+    (' + '.join(['i'] * 5000), 5000),
+    ('i - (' * 5000 + 'i' + ')' * 5000, 1),
+    ('- ' * 5000 + 'i', 1),
+])
+def test_deep_expression(expression, value):
+    session = Session(f'program P; var i, j : integer; begin j := {expression} end.')
+    assert session.run(i=1)['j'] == value
+
+
+def test_bad_binding_diagnostic():
+    init_worker(1)
+    response = execute({'id': 1, 'source': PROGRAM, 'bindings': {'i': 0.5}})
+    assert response['status'] == 'error'
+    assert response['diagnostics'][0]['message'] == "variable 'i' is INTEGER, not float"
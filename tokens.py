@@ -0,0 +1,314 @@
+"""
+Token is on behalf of
+"""
+from array import array
+from bisect import bisect_right
+from enum import Enum
+
+
+class TokenType(Enum):
+    # single-character token types
+    PLUS = '+'
+    MINUS = '-'
+    MUL = '*'
+    FLOAT_DIV = '/'
+    LPAREN = '('
+    RPAREN = ')'
+    SEMI = ';'
+    DOT = '.'
+    COLON = ':'
+    COMMA = ','
+    # block of reserved words
+    PROGRAM = 'PROGRAM'  # marks the beginning of the block
+    INTEGER = 'INTEGER'
+    REAL = 'REAL'
+    INTEGER_DIV = 'DIV'
+    VAR = 'VAR'
+    PROCEDURE = 'PROCEDURE'
+    BEGIN = 'BEGIN'
+    END = 'END'  # marks the end of the block
+    # misc
+    ID = 'ID'
+    INTEGER_CONST = 'INTEGER_CONST'
+    REAL_CONST = 'REAL_CONST'
+    ASSIGN = ':='
+    EOF = 'EOF'
+
+
+class LineIndex(object):
+    """line-start index of a source text, built once per source.
+
+    Tokens only keep their character offset, line number and column
+    are resolved from the offset with bisect when somebody asks for them.
+    """
+    __slots__ = ('starts',)
+
+    def __init__(self, text=''):
+        self.starts = array('q', [0])  # offset where each line starts
+        self.extend(text, 0)
+
+    def extend(self, text, offset):
+        """add the lines of a chunk of text that starts at offset,
+        for sources that are read chunk by chunk
+        """
+        pos = text.find('\n')
+        while pos != -1:
+            self.starts.append(offset + pos + 1)
+            pos = text.find('\n', pos + 1)
+
+    def lineno(self, offset):
+        """1-based line number of the offset"""
+        return bisect_right(self.starts, offset)
+
+    def column(self, offset):
+        """1-based column number of the offset"""
+        return offset - self.starts[self.lineno(offset) - 1] + 1
+
+    def position(self, offset):
+        """(lineno, column) of the offset"""
+        lineno = bisect_right(self.starts, offset)
+        return lineno, offset - self.starts[lineno - 1] + 1
+
+
+class Token(object):
+    __slots__ = ('type', 'value', 'offset', 'lines')
+
+    def __init__(self, type, value, offset=None, lines=None):
+        self.type = type  # token's type
+        self.value = value  # token's value
+        self.offset = offset  # character offset in the source
+        self.lines = lines  # line index of the source
+
+    @property
+    def lineno(self):
+        """line number, computed from the offset"""
+        if self.offset is None or self.lines is None:
+            return None
+        return self.lines.lineno(self.offset)
+
+    @property
+    def column(self):
+        """column number, computed from the offset"""
+        if self.offset is None or self.lines is None:
+            return None
+        return self.lines.column(self.offset)
+
+    def __str__(self):
+        """String representation of the class instance.
+
+        Example:
+            >>> lines = LineIndex('\\n\\n\\n\\n' + ' ' * 9 + '7')
+            >>> Token(TokenType.INTEGER_CONST, 7, offset=13, lines=lines)
+            Token(TokenType.INTEGER_CONST, 7, position=5:10)
+        """
+        return 'Token({type}, {value}, position={lineno}:{column})'.format(
+            type=self.type,
+            value=repr(self.value),
+            lineno=self.lineno,
+            column=self.column,
+        )
+
+    __repr__ = __str__
+
+
+# reserved keyword in language
+def _build_reserved_keywords():
+    """Build a dictionary of reserved keywords.
+    The function relies on the fact that in the TokenType
+    enumeration the beginning of the block of reserved keywords is
+    marked with PROGRAM and the end of the block is marked with
+    the END keyword.
+    Result:
+        {'PROGRAM': <TokenType.PROGRAM: 'PROGRAM'>,
+         'INTEGER': <TokenType.INTEGER: 'INTEGER'>,
+         'REAL': <TokenType.REAL: 'REAL'>,
+         'DIV': <TokenType.INTEGER_DIV: 'DIV'>,
+         'VAR': <TokenType.VAR: 'VAR'>,
+         'PROCEDURE': <TokenType.PROCEDURE: 'PROCEDURE'>,
+         'BEGIN': <TokenType.BEGIN: 'BEGIN'>,
+         'END': <TokenType.END: 'END'>}
+    """
+    # enumerations support iteration, in definition order
+    tt_list = list(TokenType)
+    start_index = tt_list.index(TokenType.PROGRAM)
+    end_index = tt_list.index(TokenType.END)
+    reserved_keywords = {
+        token_type.value: token_type
+        for token_type in tt_list[start_index:end_index + 1]
+    }
+    return reserved_keywords
+
+
+RESERVED_KEYWORDS = _build_reserved_keywords()
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    names     -------------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+NO_NAME = -1  # id of a token that is not a name
+
+
+class Names(object):
+    """the identifiers and keywords of one compilation, each spelling is
+    interned once and gets a small integer id.
+
+    A keyword is recognized when its spelling is interned, so upper()
+    and the RESERVED_KEYWORDS lookup happen once per distinct spelling
+    instead of once per lexeme. Every token of a name shares the one
+    string, the symbol tables, slots and records keyed by it hash it
+    once and compare it by identity.
+    """
+    __slots__ = ('ids', 'names', 'types')
+
+    def __init__(self):
+        self.ids = {}  # spelling -> id
+        self.names = []  # id -> the name, upper case for a keyword
+        self.types = []  # id -> TokenType.ID or the keyword's type
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, spelling):
+        """the id of spelling, added the first time it is seen"""
+        name = self.ids.get(spelling)
+        if name is None:
+            name = self.add(spelling)
+        return name
+
+    def add(self, spelling):
+        name = self.ids[spelling] = len(self.names)
+        token_type = RESERVED_KEYWORDS.get(spelling.upper())
+        if token_type is None:
+            self.names.append(spelling)
+            self.types.append(TokenType.ID)
+        else:
+            # reserved keyword
+            self.names.append(token_type.value)
+            self.types.append(token_type)
+        return name
+
+    def spellings(self):
+        """the interned spellings, in id order"""
+        return list(self.ids)
+
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+--------------------    token stream     ------------------------
+"""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""""
+
+# a TokenStream stores the index of the token type in this tuple
+TOKEN_TYPES = tuple(TokenType)
+_TOKEN_KINDS = {token_type: kind for kind, token_type in enumerate(TOKEN_TYPES)}
+
+
+class TokenStream(object):
+    """columnar token stream (struct of arrays).
+
+    Token kinds, offsets, lengths and name ids are kept in array
+    columns and the values of number literals in a side table, the
+    names are in the stream's Names and the operators are sliced from
+    the source text when they are asked for. So no Token object is
+    allocated per lexeme.
+    """
+
+    def __init__(self, text, lines=None, names=None):
+        self.text = text  # the program character
+        self.lines = lines if lines is not None else LineIndex(text)
+        self.names = names if names is not None else Names()  # the identifiers and keywords
+        self.kinds = array('B')  # index of the token type in TOKEN_TYPES
+        self.offsets = array('q')  # character offset
+        self.lengths = array('I')  # lexeme length
+        self.ids = array('i')  # id in names, NO_NAME for the other tokens
+        self.literals = {}  # token index -> value of number literals
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, token_type, offset, length, value=None, name=NO_NAME):
+        if value is not None:
+            self.literals[len(self.kinds)] = value
+        self.kinds.append(_TOKEN_KINDS[token_type])
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.ids.append(name)
+
+    def extend(self, kinds, offsets, lengths, ids, spellings, literals):
+        """append the columns of another stream, its literals are keyed
+        by their index in that stream and its ids are those of its
+        spellings, they are interned again in this stream's names
+        """
+        base = len(self.kinds)
+        self.kinds.extend(kinds)
+        self.offsets.extend(offsets)
+        self.lengths.extend(lengths)
+        intern = self.names.intern
+        renamed = [intern(spelling) for spelling in spellings]
+        renamed.append(NO_NAME)  # so that renamed[NO_NAME] is NO_NAME
+        self.ids.extend([renamed[name] for name in ids])
+        for index, value in literals.items():
+            self.literals[base + index] = value
+
+    def type(self, index):
+        return TOKEN_TYPES[self.kinds[index]]
+
+    def value(self, index):
+        """the token's value, same as the one a lexer puts in Token"""
+        name = self.ids[index]
+        if name != NO_NAME:
+            return self.names.names[name]
+        value = self.literals.get(index)
+        if value is not None:
+            return value
+        if TOKEN_TYPES[self.kinds[index]] is TokenType.EOF:
+            return None
+        offset = self.offsets[index]
+        return self.text[offset:offset + self.lengths[index]]
+
+    def token(self, index):
+        """create the Token at index"""
+        token_type = TOKEN_TYPES[self.kinds[index]]
+        if token_type is TokenType.EOF:
+            return Token(TokenType.EOF, None)
+        return Token(token_type, self.value(index), self.offsets[index], self.lines)
+
+    def cursor(self):
+        return TokenCursor(self)
+
+
+class TokenCursor(object):
+    """cursor over a TokenStream, it has the lexer interface the parser
+    uses, but get_next_token() moves the cursor and returns the cursor
+    itself instead of a new Token.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.index = -1  # index of the current token
+        self.type = None  # type of the current token
+
+    def get_next_token(self):
+        if self.index < len(self.stream) - 1:
+            self.index += 1
+        self.type = TOKEN_TYPES[self.stream.kinds[self.index]]
+        return self
+
+    @property
+    def value(self):
+        return self.stream.value(self.index)
+
+    @property
+    def current_char(self):
+        """the character right after the current token"""
+        stream = self.stream
+        end = stream.offsets[self.index] + stream.lengths[self.index]
+        return stream.text[end] if end < len(stream.text) else None
+
+    def token(self):
+        """create the Token the cursor is on, for AST nodes and errors"""
+        return self.stream.token(self.index)
+
+    def __str__(self):
+        return str(self.token())
+
+    __repr__ = __str__
@@ -0,0 +1,110 @@
+"""
+tracing
+
+structured trace events by category. The call sites check the flag of
+the category before they build an event, so a disabled category costs
+one attribute load and nothing is formatted or written.
+
+    if tracer.scope:
+        tracer.emit(SCOPE, 'insert', f'Insert: {name}', name=name)
+"""
+import json
+import sys
+
+SCOPE = 'scope'  # entering and leaving scopes, symbol inserts, symbol tables
+LOOKUP = 'lookup'  # symbol lookups
+CALL_STACK = 'callstack'  # call stack dumps
+EXECUTION = 'execution'  # entering and leaving programs and procedures
+
+CATEGORIES = (SCOPE, LOOKUP, CALL_STACK, EXECUTION)
+
+
+class TextSink(object):
+    """the messages of the events as text lines, written in batches
+    to a stream (stdout by default)
+    """
+
+    def __init__(self, stream=None, buffer_lines=1024):
+        self.stream = stream
+        self.buffer_lines = buffer_lines
+        self.lines = []
+
+    def write(self, category, event, message, fields):
+        self.lines.append(message)
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write('\n'.join(self.lines) + '\n')
+            stream.flush()
+            self.lines.clear()
+
+    def close(self):
+        self.flush()
+
+
+class JsonLinesSink(object):
+    """one JSON object per event and line:
+    {"category": ..., "event": ..., "message": ..., <fields>}
+    """
+
+    def __init__(self, file):
+        self._owned = isinstance(file, str)
+        self.file = open(file, 'w') if self._owned else file
+
+    def write(self, category, event, message, fields):
+        record = {'category': category, 'event': event, 'message': message}
+        record.update(fields)
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class Tracer(object):
+    """every category is a boolean attribute, False while disabled"""
+
+    def __init__(self):
+        self.sink = None
+        for category in CATEGORIES:
+            setattr(self, category, False)
+
+    def enable(self, categories, sink=None):
+        unknown = set(categories) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f'unknown trace categories: {", ".join(sorted(unknown))}')
+        if sink is not None:
+            self.sink = sink
+        elif self.sink is None:
+            self.sink = TextSink()
+        for category in categories:
+            setattr(self, category, True)
+
+    def disable(self):
+        for category in CATEGORIES:
+            setattr(self, category, False)
+        self.close()
+        self.sink = None
+
+    def emit(self, category, event, message, **fields):
+        self.sink.write(category, event, message, fields)
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+# the process-wide tracer
+tracer = Tracer()
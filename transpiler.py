@@ -0,0 +1,273 @@
+"""
+transpiler
+
+a checked program is turned into Python source: the program and its
+procedures become (nested) functions and the variables their locals.
+CPython compiles it with compile() and runs it, a line map points the
+runtime errors back to the Nan source.
+"""
+import math
+
+import nodes
+from error import ExecutionError
+from interpreter import ActivationRecord, ARType, CallStack, NodeVisitor
+from tokens import TokenType
+from tracing import CALL_STACK, EXECUTION, tracer
+
+# the python precedences of the generated expressions, an operand is
+# parenthesized only when its precedence is lower than its place needs:
+# CPython allows no more than 200 nested parentheses
+SUM, PRODUCT, UNARY, ATOM = 1, 2, 3, 4
+
+# operator -> (python operator, precedence), all of them left associative
+BINARY_OPERATORS = {
+    TokenType.PLUS: ('+', SUM),
+    TokenType.MINUS: ('-', SUM),
+    TokenType.MUL: ('*', PRODUCT),
+    TokenType.INTEGER_DIV: ('//', PRODUCT),
+    TokenType.FLOAT_DIV: ('/', PRODUCT),
+}
+
+UNARY_OPERATORS = {
+    TokenType.PLUS: '+',
+    TokenType.MINUS: '-',
+}
+
+INDENT = '    '
+
+
+def _var(name):
+    # prefixed, so a Nan name never clashes with a Python keyword or builtin
+    return 'v_' + name
+
+
+def _proc(name):
+    return 'p_' + name
+
+
+def _names(node, assigned, read):
+    """collect the variables a statement assigns and reads, procedure
+    declarations are not part of the statements
+    """
+    if isinstance(node, nodes.Compound):
+        for child in node.children:
+            _names(child, assigned, read)
+    elif isinstance(node, nodes.Assign):
+        _names(node.right, assigned, read)
+        if node.left.value not in assigned:
+            assigned.append(node.left.value)
+    elif isinstance(node, nodes.ProcedureCall):
+        for param in node.actual_params:
+            _names(param, assigned, read)
+    elif isinstance(node, nodes.Var):
+        read.add(node.value)
+    elif isinstance(node, nodes.BinOp):
+        _names(node.left, assigned, read)
+        _names(node.right, assigned, read)
+    elif isinstance(node, nodes.UnaryOp):
+        _names(node.expr, assigned, read)
+
+
+class PythonGenerator(NodeVisitor):
+    """generate the Python source of a program
+
+    line_map[i] is the token of the Nan statement python line i + 1
+    comes from (or None)
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.line_map = []
+        self.level = 0  # indent level
+        self.scopes = []  # local variable names of the enclosing functions
+        self.program_assigned = []  # program variables assigned by procedures
+
+    def generate(self, tree):
+        self.visit(tree)
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, line, token=None):
+        self.lines.append(INDENT * self.level + line)
+        self.line_map.append(token)
+
+    def function(self, name, params, block):
+        """emit the head of the function of a program or procedure block
+        and its body, the caller closes it. Return the names it assigns,
+        in the order they are assigned.
+        """
+        param_names = [param.var_node.value for param in params]
+        var_names = [
+            declaration.var_node.value for declaration in block.declarations
+            if isinstance(declaration, nodes.VarDecl)
+        ]
+        declared = param_names + var_names
+        assigned = []
+        read = set()
+        _names(block.compound_statement, assigned, read)
+
+        # undeclared names that no enclosing function has are locals too
+        enclosing = set().union(*self.scopes)
+        local = list(var_names)
+        for var_name in assigned + sorted(read):
+            if var_name not in declared and var_name not in enclosing and var_name not in local:
+                local.append(var_name)
+        nonlocal_names = [
+            var_name for var_name in assigned
+            if var_name not in declared and var_name in enclosing
+        ]
+        # program variables assigned by a procedure
+        for var_name in nonlocal_names:
+            scope = next(scope for scope in reversed(self.scopes) if var_name in scope)
+            if scope is self.scopes[0] and var_name not in self.program_assigned:
+                self.program_assigned.append(var_name)
+
+        self.emit('def {name}({params}):'.format(
+            name=name,
+            params=', '.join(map(_var, param_names)),
+        ))
+        self.level += 1
+        if nonlocal_names:
+            self.emit('nonlocal ' + ', '.join(map(_var, nonlocal_names)))
+        for var_name in local:
+            self.emit(f'{_var(var_name)} = None')
+
+        self.scopes.append(set(declared) | set(local))
+        for declaration in block.declarations:
+            self.visit(declaration)
+        self.visit(block.compound_statement)
+        self.scopes.pop()
+        return assigned
+
+    def visit_Program(self, node):
+        self.emit(f'# program {node.name}')
+        assigned = self.function('program', [], node.block)
+        for var_name in self.program_assigned:
+            if var_name not in assigned:
+                assigned.append(var_name)
+        # the final values of the assigned variables
+        self.emit('return {' + ', '.join(
+            f'{var_name!r}: {_var(var_name)}' for var_name in assigned
+        ) + '}')
+        self.level -= 1
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        self.function(_proc(node.proc_name), node.params, node.block_node)
+        self.emit('pass')
+        self.level -= 1
+
+    def visit_ProcedureCall(self, node):
+        self.emit('{name}({params})'.format(
+            name=_proc(node.proc_name),
+            params=', '.join(map(self.visit, node.actual_params)),
+        ), node.token)
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_Assign(self, node):
+        self.emit(f'{_var(node.left.value)} = {self.visit(node.right)}', node.left.token)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Var(self, node):
+        return _var(node.value)
+
+    def visit_Num(self, node):
+        value = node.value
+        if isinstance(value, float) and not math.isfinite(value):
+            # the repr is inf, -inf or nan, which python has no literal for
+            return f"float('{value!r}')"
+        return repr(value)
+
+    def visit_BinOp(self, node):
+        operator, precedence = BINARY_OPERATORS[node.op.type]
+        # a - (b - c): the right operand of the same precedence needs them
+        left = self.operand(node.left, precedence)
+        right = self.operand(node.right, precedence + 1)
+        return f'{left} {operator} {right}'
+
+    def visit_UnaryOp(self, node):
+        if node.op.type == TokenType.REAL:
+            return f'float({self.visit(node.expr)})'
+        return UNARY_OPERATORS[node.op.type] + self.operand(node.expr, UNARY)
+
+    def operand(self, node, precedence):
+        """the source of an operand, parenthesized when it binds less
+        tightly than precedence
+        """
+        source = self.visit(node)
+        if node.__class__ is nodes.BinOp:
+            own = BINARY_OPERATORS[node.op.type][1]
+        elif node.__class__ is nodes.UnaryOp:
+            own = ATOM if node.op.type == TokenType.REAL else UNARY
+        else:
+            # a negative number is a unary minus to python
+            own = UNARY if source.startswith('-') else ATOM
+        return f'({source})' if own < precedence else source
+
+
+class PythonInterpreter(object):
+    """run the program as compiled Python code, it has the same
+    interface as Interpreter
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.call_stack = CallStack()
+        generator = PythonGenerator()
+        self.filename = f'<nan program {tree.name}>'
+        try:
+            self.source = generator.generate(tree)
+            code = compile(self.source, self.filename, 'exec')
+        except (SyntaxError, RecursionError, ValueError) as e:
+            # an expression nested too deep for the generator or for
+            # CPython's parser, or an int literal over the digits limit
+            raise ExecutionError.from_exception(e, None) from e
+        self.line_map = generator.line_map
+        namespace = {}
+        exec(code, namespace)
+        self.function = namespace['program']
+
+    def error(self, exc):
+        """the error of an exception raised by the program, with the
+        token of the innermost Nan statement that raised it
+        """
+        token = None
+        tb = exc.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == self.filename:
+                token = self.line_map[tb.tb_lineno - 1] or token
+            tb = tb.tb_next
+        return ExecutionError.from_exception(exc, token)
+
+    def interpret(self):
+        program_name = self.tree.name
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'enter', f'ENTER: PROGRAM {program_name}',
+                        type='PROGRAM', name=program_name)
+        ar = ActivationRecord(
+            name=program_name,
+            type=ARType.PROGRAM,
+            nesting_level=1,
+            var_slots=self.tree.var_slots,
+        )
+        self.call_stack.push(ar)
+
+        try:
+            members = self.function()
+        except Exception as e:
+            raise self.error(e) from e
+        for name, value in members.items():
+            ar[name] = value
+
+        if tracer.execution:
+            tracer.emit(EXECUTION, 'leave', f'LEAVE: PROGRAM {program_name}',
+                        type='PROGRAM', name=program_name)
+        if tracer.callstack:
+            tracer.emit(CALL_STACK, 'dump', str(self.call_stack), records=self.call_stack.to_list())
+        self.call_stack.pop()